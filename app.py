@@ -1,81 +1,251 @@
-import csv
-from collections import defaultdict
-from docx import Document
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.shared import Inches, Pt, RGBColor
-from docx.oxml import OxmlElement
-import matplotlib.pyplot as plt
+import copy
+import hashlib
+import io
+import json
+import logging
+import math
+import time
 import os
+import shutil
+import uuid
+import zipfile
 from datetime import datetime
-from flask import Flask, render_template, request, send_file, jsonify, url_for
+from flask import Flask, Request, g, render_template, request, send_file, jsonify, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename, send_file as send_file_from
 import urllib.parse
+import app_logging
+from app_logging import stage
+from charts import render_bar_chart, render_line_chart, render_series_chart
+from history import EngineHistory, HistoryUnavailableError
+from jobs import JobQueue, QueueFullError, failure_message
+from metrics import Metrics, directory_size
+from report_cache import ReportCache
+import yds_parser
+from yds_parser import YdsParseError
+from workspace import Workspace, WorkspaceSweeper, is_workspace_id
+
+# Data-log exports of long sea trials run to tens of MB; they are parsed as a stream in flat memory
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 64 * 1024 * 1024))
+# Form uploads up to this size stay in memory, larger ones are spooled to a temporary file
+IN_MEMORY_UPLOAD_SIZE = 5 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+# Bump whenever the generated document changes so cached reports are not reused
+REPORT_TEMPLATE_VERSION = 6
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+# output format -> (file extension, mimetype)
+OUTPUT_FORMATS = {
+    'docx': ('docx', DOCX_MIMETYPE),
+    'json': ('json', 'application/json'),
+    'columnar': ('npz', 'application/octet-stream'),
+    'pdf': ('pdf', 'application/pdf'),
+}
+# Section 7 channels charted in the report, by (channel name, unit)
+DATA_LOG_CHARTS = [
+    ("Engine speed", "r/min"),
+    ("Cooling water temperature", "°C"),
+    ("Battery voltage", "V"),
+]
+# Min/max buckets per data-log chart, about one per horizontal pixel
+DATA_LOG_BUCKETS = 600
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "newlogo.png")
+LOGO_WIDTH_INCHES = 3.5
+# Compact reports (COMPACT_REPORTS): palette size of chart PNGs and the logo, and the logo's print resolution
+COMPACT_COLORS = 64
+COMPACT_LOGO_DPI = 200
+# Word 2010-only copy of styles.xml in python-docx's default template: the largest part of a compact
+# report, and newer Word versions (and LibreOffice) ignore it
+STYLES_WITH_EFFECTS_RELTYPE = 'http://schemas.microsoft.com/office/2007/relationships/stylesWithEffects'
+
+app_logging.configure()
+logger = logging.getLogger(__name__)
+
+class WsgiInput(io.RawIOBase):
+    """Adapts a bare WSGI input stream (e.g. gunicorn's, which only has read()) to the io interface."""
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+class UploadRequest(Request):
+    """Keeps small single-report uploads in memory instead of spooling them to a temp file.
+
+    /process takes one export, so its body is held to MAX_UPLOAD_SIZE; the batch
+    and fleet routes get MAX_CONTENT_LENGTH. Either way a chunked body with no
+    Content-Length is cut off at the limit too.
+    """
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'process':
+            return MAX_UPLOAD_SIZE
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= IN_MEMORY_UPLOAD_SIZE:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config['UPLOAD_FOLDER'] = '/tmp/uploads'
 app.config['DOWNLOAD_FOLDER'] = '/tmp/downloads'
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key')
+app.config['JOBS_FOLDER'] = '/tmp/jobs'
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('JOB_QUEUE_SIZE', 16))
+app.config['WORKSPACE_MAX_AGE'] = int(os.environ.get('WORKSPACE_MAX_AGE', 3600))
+app.config['WORKSPACE_MAX_BYTES'] = int(os.environ.get('WORKSPACE_MAX_BYTES', 1024 * 1024 * 1024))
+app.config['WORKSPACE_SWEEP_INTERVAL'] = int(os.environ.get('WORKSPACE_SWEEP_INTERVAL', 60))
+app.config['CHART_BACKEND'] = os.environ.get('CHART_BACKEND', 'matplotlib')
+# Smaller .docx files: palette-quantized charts, a downscaled logo and no Word 2010 style copy
+app.config['COMPACT_REPORTS'] = os.environ.get('COMPACT_REPORTS', '1') == '1'
+app.config['CACHE_FOLDER'] = '/tmp/report_cache'
+app.config['REPORT_CACHE_ENABLED'] = os.environ.get('REPORT_CACHE_ENABLED', '1') == '1'
+app.config['REPORT_CACHE_MAX_BYTES'] = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+app.config['REPORT_CACHE_MAX_AGE'] = int(os.environ.get('REPORT_CACHE_MAX_AGE', 7 * 24 * 3600))
+app.config['BATCH_MAX_WORKERS'] = int(os.environ.get('BATCH_MAX_WORKERS', os.cpu_count() or 1))
+app.config['BATCH_MAX_FILES'] = int(os.environ.get('BATCH_MAX_FILES', 50))
+# A batch always has room for at least one maximum-size export
+app.config['BATCH_MAX_SIZE'] = max(int(os.environ.get('BATCH_MAX_SIZE', 128 * 1024 * 1024)), MAX_UPLOAD_SIZE)
+app.config['MAX_CONTENT_LENGTH'] = app.config['BATCH_MAX_SIZE']
+# Zip uploads are checked against these before anything is extracted
+app.config['BATCH_MAX_UNCOMPRESSED_SIZE'] = int(os.environ.get('BATCH_MAX_UNCOMPRESSED_SIZE', 256 * 1024 * 1024))
+app.config['FLEET_MAX_FILES'] = int(os.environ.get('FLEET_MAX_FILES', 500))
+app.config['METRICS_FOLDER'] = os.environ.get('METRICS_FOLDER', '/tmp/metrics')
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+app.config['HISTORY_DB'] = os.environ.get('HISTORY_DB', '/tmp/history/engines.sqlite3')
+app.config['HISTORY_ENABLED'] = os.environ.get('HISTORY_ENABLED', '1') == '1'
+# Health check thresholds per model and diagnosis code names (see health.py)
+app.config['HEALTH_SPECS'] = os.environ.get('HEALTH_SPECS', os.path.join(app.root_path, 'Static', 'health_specs.csv'))
+app.config['DIAGNOSIS_CODES'] = os.environ.get('DIAGNOSIS_CODES', os.path.join(app.root_path, 'Static', 'diagnosis_codes.csv'))
+# Reports are immutable under their job URL, so browsers may keep them as long as the workspace lives
+app.config['DOWNLOAD_MAX_AGE'] = int(os.environ.get('DOWNLOAD_MAX_AGE', app.config['WORKSPACE_MAX_AGE']))
+# Let the reverse proxy stream downloads: '' (serve from Python), 'x-sendfile' (Apache, lighttpd)
+# or 'x-accel-redirect' (nginx), which needs an internal location mapping the prefix to DOWNLOAD_FOLDER:
+#     location /_downloads/ { internal; alias /tmp/downloads/; }
+app.config['DOWNLOAD_SENDFILE'] = os.environ.get('DOWNLOAD_SENDFILE', '').lower()
+app.config['DOWNLOAD_ACCEL_PREFIX'] = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/_downloads/')
 
 # Ensure upload and download directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
 
-def is_section_start(row):
-    return len(row) > 0 and row[0].strip('"').startswith(tuple(str(i) + '.' for i in range(1, 8)))
+metrics = Metrics(app.config['METRICS_FOLDER'], enabled=app.config['METRICS_ENABLED'])
+# Batches run on the job pool too, so it has room for BATCH_MAX_WORKERS files at once
+job_queue = JobQueue(
+    app.config['JOBS_FOLDER'],
+    max_workers=max(app.config['JOB_WORKERS'], app.config['BATCH_MAX_WORKERS']),
+    max_pending=app.config['JOB_QUEUE_SIZE'],
+    on_finish=lambda job: metrics.inc('yds_jobs_total', {'status': job['status']}),
+)
+metrics.add_collector(lambda: metrics.set_gauge('yds_jobs_pending', job_queue.pending))
+metrics.add_collector(lambda: metrics.set_gauge('yds_job_workers', job_queue.workers))
+workspace_sweeper = WorkspaceSweeper(
+    [app.config['UPLOAD_FOLDER'], app.config['DOWNLOAD_FOLDER'], app.config['JOBS_FOLDER']],
+    max_age=app.config['WORKSPACE_MAX_AGE'],
+    max_bytes=app.config['WORKSPACE_MAX_BYTES'],
+    interval=app.config['WORKSPACE_SWEEP_INTERVAL'],
+)
+def _files_digest(*paths):
+    """Short digest of the files' contents, so cached reports are not reused after a spec file is edited."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+report_cache = ReportCache(
+    app.config['CACHE_FOLDER'],
+    f"{REPORT_TEMPLATE_VERSION}-{app.config['CHART_BACKEND']}{'-compact' if app.config['COMPACT_REPORTS'] else ''}"
+    f"-{_files_digest(app.config['HEALTH_SPECS'], app.config['DIAGNOSIS_CODES'])}",
+    max_bytes=app.config['REPORT_CACHE_MAX_BYTES'],
+    max_age=app.config['REPORT_CACHE_MAX_AGE'],
+)
+engine_history = EngineHistory(app.config['HISTORY_DB'], enabled=app.config['HISTORY_ENABLED'])
+_health_index = None
+
+def health_index():
+    """The compiled health.HealthIndex, loaded on first use (gunicorn workers load it in warm_up)."""
+    from health import HealthIndex
+
+    global _health_index
+    if _health_index is None:
+        _health_index = HealthIndex.load(app.config['HEALTH_SPECS'], app.config['DIAGNOSIS_CODES'])
+    return _health_index
+
+def new_workspace():
+    return Workspace(app.config['UPLOAD_FOLDER'], app.config['DOWNLOAD_FOLDER'])
+
+def warm_up():
+    """Render one throwaway report from Static/sample.csv and return the seconds it took.
+
+    The first report in a process pays for importing python-docx and matplotlib,
+    loading fonts and building the chart and document templates; gunicorn.conf.py
+    calls this before a worker accepts traffic. The dummy render isn't counted in
+    metrics or recorded in the engine history.
+    """
+    start = time.perf_counter()
+    enabled = metrics.enabled, engine_history.enabled
+    metrics.enabled = engine_history.enabled = False
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Static', 'sample.csv'),
+                  encoding='utf-8', newline='') as f:
+            render_report_to_buffer(f)
+    finally:
+        metrics.enabled, engine_history.enabled = enabled
+    elapsed = time.perf_counter() - start
+    logger.info("Warm-up report rendered", extra={'duration_ms': round(elapsed * 1000, 2)})
+    return elapsed
+
+def chart_colors():
+    """Palette size for chart PNGs: COMPACT_COLORS in compact mode, else None (full colour)."""
+    return COMPACT_COLORS if app.config['COMPACT_REPORTS'] else None
 
 def create_bar_graph(speed_ranges, hours, output_path):
-    print("Creating bar graph...")
+    """Render the operating-hours bar chart as PNG to output_path (a path or binary file object)."""
     try:
-        plt.figure(figsize=(5.5, 4.0), facecolor='white')
-        bars = plt.bar(speed_ranges, hours, color='#4C78A8', edgecolor='black', linewidth=1.2, alpha=0.9, width=0.5)
-        plt.xlabel("Engine Speed Range (r/min)", fontsize=10, labelpad=15, fontweight='bold')
-        plt.ylabel("Hours", fontsize=10, labelpad=15, fontweight='bold')
-        plt.xticks(rotation=45, ha='right', fontsize=8)
-        plt.yticks(fontsize=8)
-        plt.grid(True, axis='y', linestyle='--', alpha=0.7, color='gray')
-        for bar in bars:
-            yval = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2, yval + 0.5, f'{yval}', ha='center', va='bottom', fontsize=8, fontweight='bold')
-        ax = plt.gca()
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('gray')
-        ax.spines['bottom'].set_color('gray')
-        plt.tight_layout()
-        plt.savefig(output_path, bbox_inches='tight', dpi=100)
-        plt.close()
-        print(f"Graph saved to {output_path}")
-    except Exception as e:
-        print(f"Error creating bar graph: {str(e)}")
+        with stage('chart_bar'):
+            render_bar_chart(speed_ranges, hours, output_path, backend=app.config['CHART_BACKEND'],
+                             colors=chart_colors())
+        metrics.inc('yds_chart_renders_total', {'chart': 'bar', 'backend': app.config['CHART_BACKEND']})
+    except Exception:
+        logger.exception("Error creating bar graph")
         raise
 
 def create_line_graph(times, hours, output_path):
-    print("Creating line graph for engine oil exchange...")
+    """Render the oil-exchange line chart as PNG to output_path (a path or binary file object)."""
     try:
-        plt.figure(figsize=(3.5, 2.5), facecolor='white')
-        plt.plot(times, hours, marker='o', color='#FF6F61', linewidth=2, markersize=6, markerfacecolor='#FF6F61', markeredgecolor='black', markeredgewidth=1)
-        for time, hour in zip(times, hours):
-            plt.text(time, hour + 50, f'{hour}', ha='center', va='bottom', fontsize=6, fontweight='bold')
-        plt.xlabel("Record Number", fontsize=8, labelpad=10, fontweight='bold')
-        plt.ylabel("Engine Hours", fontsize=8, labelpad=10, fontweight='bold')
-        plt.xticks(times, fontsize=6)
-        plt.yticks(fontsize=6)
-        plt.grid(True, linestyle='--', alpha=0.7, color='gray')
-        ax = plt.gca()
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('gray')
-        ax.spines['bottom'].set_color('gray')
-        plt.tight_layout()
-        plt.savefig(output_path, bbox_inches='tight', dpi=100)
-        plt.close()
-        print(f"Line graph saved to {output_path}")
-    except Exception as e:
-        print(f"Error creating line graph: {str(e)}")
+        with stage('chart_line'):
+            render_line_chart(times, hours, output_path, backend=app.config['CHART_BACKEND'],
+                              colors=chart_colors())
+        metrics.inc('yds_chart_renders_total', {'chart': 'line', 'backend': app.config['CHART_BACKEND']})
+    except Exception:
+        logger.exception("Error creating line graph")
+        raise
+
+def create_series_graph(series, time_unit, output_path):
+    """Render one reduced data-log channel (a DATA_LOG_CHARTS entry of extract_report_data) as PNG."""
+    try:
+        with stage('chart_data_log'):
+            lows = [math.nan if v is None else v for v in series['min']]
+            highs = [math.nan if v is None else v for v in series['max']]
+            xlabel = f"Time ({time_unit})" if time_unit else "Time"
+            render_series_chart(series['time'], lows, highs, output_path, xlabel, f"{series['name']} ({series['unit']})",
+                                backend=app.config['CHART_BACKEND'], colors=chart_colors())
+        metrics.inc('yds_chart_renders_total', {'chart': 'data_log', 'backend': app.config['CHART_BACKEND']})
+    except Exception:
+        logger.exception("Error creating data log graph")
         raise
 
 def remove_table_outer_borders(table):
     """Helper function to remove outer borders of a table while keeping inner borders."""
+    from docx.oxml import OxmlElement
     tbl = table._element
     tblPr = tbl.tblPr
     tblBorders = tblPr.find('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}tblBorders')
@@ -91,6 +261,7 @@ def remove_table_outer_borders(table):
 
 def remove_all_table_borders(table):
     """Helper function to remove all borders (inner and outer) from a table."""
+    from docx.oxml import OxmlElement
     tbl = table._element
     tblPr = tbl.tblPr
     tblBorders = tblPr.find('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}tblBorders')
@@ -104,250 +275,402 @@ def remove_all_table_borders(table):
         border_elem.set('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}val', 'nil')
         tblBorders.append(border_elem)
 
-def process_csv_to_tables(file_path, output_dir):
+def read_report(lines, source=''):
+    """Parse CSV text lines into a YdsReport, reporting failures the way the routes expect.
+
+    Every export read is also appended to the engine history.
+    """
     try:
-        print(f"Reading CSV file: {file_path}")
-        sections = defaultdict(list)
-        current_section = "Metadata"
-        customer_name = "Unknown"
-        
+        with stage('parse'):
+            report = yds_parser.parse(lines)
+    except YdsParseError as e:
+        logger.warning("Error reading CSV: %s", e)
+        raise Exception(f"Failed to read CSV file: {str(e)}")
+    logger.debug("Parsed report", extra={'sections': sorted(report.sections_found), 'customer': report.customer_name})
+    with stage('history'):
+        engine_history.record(report, source)
+    return report
+
+def report_filename(customer_name, output_format='docx'):
+    today = datetime.now().strftime("%d-%m-%y")
+    safe_customer_name = customer_name.replace(" ", "_").replace("/", "_").replace("\\", "_")
+    return f"{safe_customer_name}_Yamaha_Diagnostics_Report_{today}.{OUTPUT_FORMATS[output_format][0]}"
+
+def write_report(report, output, output_format='docx'):
+    """Write a parsed report to output (a path or binary file object) in the given output format.
+
+    'json' and 'columnar' write only the extracted table data and skip chart
+    rendering and document assembly entirely. 'pdf' lays the same data out
+    directly as a PDF (see pdf_report.py), with no Word document in between.
+    Returns the extract_report_data dict the output was rendered from.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    data = extract_report_data(report)
+    if output_format == 'docx':
+        doc = build_report_document(report, data)
+        with stage('save'):
+            doc.save(output)
+    elif output_format == 'json':
+        payload = json.dumps(data).encode('utf-8')
+        if isinstance(output, str):
+            with open(output, 'wb') as f:
+                f.write(payload)
+        else:
+            output.write(payload)
+    elif output_format == 'columnar':
+        write_columnar(data, output)
+    elif output_format == 'pdf':
+        from pdf_report import write_pdf
+        with stage('pdf_build'):
+            write_pdf(data, output)
+    return data
+
+def process_csv_to_tables(file_path, output_dir, output_format='docx'):
+    return _process_csv(file_path, output_dir, output_format)[0]
+
+def _process_csv(file_path, output_dir, output_format='docx'):
+    """process_csv_to_tables, also returning the parsed report and its extracted data: (output_file, report, data)."""
+    try:
+        logger.debug("Reading CSV file: %s", file_path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                csv_rows = list(reader)
-                print(f"Total CSV rows read: {len(csv_rows)}")
-                if not csv_rows:
-                    raise ValueError("CSV file is empty")
-        except UnicodeDecodeError as e:
-            print(f"UnicodeDecodeError while reading CSV: {str(e)}")
-            raise Exception(f"Failed to read CSV file due to encoding issue: {str(e)}")
-        except csv.Error as e:
-            print(f"CSV parsing error: {str(e)}")
-            raise Exception(f"Error parsing CSV file: {str(e)}")
-        except Exception as e:
-            print(f"Unexpected error while reading CSV: {str(e)}")
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                report = read_report(f, os.path.basename(file_path))
+        except OSError as e:
+            logger.error("Unexpected error while reading CSV: %s", e)
             raise Exception(f"Failed to read CSV file: {str(e)}")
 
-        for i, row in enumerate(csv_rows):
-            print(f"Row {i + 1}: {row}")
-            if not any(row):
-                continue
-            if is_section_start(row):
-                current_section = row[0].strip()
-                print(f"Detected section: {current_section}")
-            sections[current_section].append(row)
-            if current_section == "Metadata" and len(row) >= 1 and row[0].strip('"') == "Customer name":
-                customer_name = row[2].strip('"') if len(row) > 2 and row[2].strip('"') else row[1].strip('"') if len(row) > 1 and row[1].strip('"') else "Unknown"
-                print(f"Customer name extracted: {customer_name}")
-
-        print("CSV file read successfully. Creating Word document...")
-
-        today = datetime.now().strftime("%d-%m-%y")
-        safe_customer_name = customer_name.replace(" ", "_").replace("/", "_").replace("\\", "_")
-        output_filename = f"{safe_customer_name}_Yamaha_Diagnostics_Report_{today}.docx"
-        output_file = os.path.join(output_dir, output_filename)
-        print(f"Output file will be saved as: {output_file}")
-
-        # Extract Total Engine Hours
-        total_engine_hours = "(empty)"
-        if "1. Engine operating hours according to engine speed" in sections:
-            print("Section 1 data:", sections["1. Engine operating hours according to engine speed"])
-            for row in sections["1. Engine operating hours according to engine speed"]:
-                if len(row) >= 1 and row[0].strip('"') == "Total operating hours":
-                    total_engine_hours = row[2].strip('"').strip() if len(row) > 2 and row[2].strip('"') else row[1].strip('"').strip() if len(row) > 1 and row[1].strip('"') else "(empty)"
-                    break
-        print(f"Total Engine Hours extracted: {total_engine_hours}")
-
-        doc = Document()
-        section = doc.sections[0]
-        section.top_margin = Inches(0.5)
-        section.bottom_margin = Inches(0.5)
-        section.left_margin = Inches(0.5)
-        section.right_margin = Inches(0.5)
-
-        print("Available table styles:")
-        for style in doc.styles:
-            if style.type == 2:
-                print(style.name)
-
-        logo_path = os.path.join(os.path.dirname(__file__), "newlogo.png")
-        if os.path.exists(logo_path):
-            header = doc.sections[0].header
-            logo_paragraph = header.add_paragraph()
-            logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = logo_paragraph.add_run()
-            run.add_picture(logo_path, width=Inches(3.5))  # Increased logo size from 3 to 3.5 inches
-            doc.sections[0].header_distance = Inches(0.1)
-        else:
-            print(f"Error: logo.png not found at {logo_path}. Skipping logo.")
+        output_file = os.path.join(output_dir, report_filename(report.customer_name, output_format))
+        logger.debug("Saving %s report to %s", output_format, output_file)
+        data = write_report(report, output_file, output_format)
+        return output_file, report, data
+
+    except Exception as e:
+        logger.warning("An error occurred in process_csv_to_tables: %s", e)
+        raise
 
-        # Add blank paragraph to create space between header and content
-        spacer_paragraph = doc.add_paragraph()
-        spacer_paragraph.space_after = Pt(20)  # Adds ~20pt (~0.28 inches) of space
-        spacer_paragraph.space_before = Pt(0)   # No extra space above
-        # Ensure the paragraph is empty and has no formatting
-        for run in spacer_paragraph.runs:
-            run.text = ""
+def render_report_to_buffer(lines, output_format='docx'):
+    """Build the report from a stream of CSV text lines entirely in memory.
 
-        # Metadata section (center-aligned, no borders, larger text, no dotted line)
-        if "Metadata" in sections:
-            print("Processing Metadata section...")
-            metadata_entries = []
-            metadata_keys = [
-                "YAMAHA DIAGNOSTIC SYSTEM", "Save date & time", "Customer name", 
-                "Dealer name", "Number of engines", "Comment", "Model name", 
-                "Engine serial number (PID number)", "ECM number"
-            ]
-            comment_value = "(empty)"
-            i = 0
-            while i < len(sections["Metadata"]):
-                row = sections["Metadata"][i]
-                if len(row) >= 1 and row[0].strip('"') in metadata_keys:
-                    field = row[0].strip('"')
-                    if field == "Comment":
-                        if i + 1 < len(sections["Metadata"]) and not is_section_start(sections["Metadata"][i + 1]):
-                            next_row = sections["Metadata"][i + 1]
-                            comment_value = next_row[0].strip('"') if len(next_row) > 0 and next_row[0].strip('"') else "(empty)"
-                            i += 1
-                    else:
-                        value = row[2].strip('"') if len(row) > 2 and row[2].strip('"') else row[1].strip('"') if len(row) > 1 and row[1].strip('"') != field else "(empty)"
-                        display_field = "Service Date" if field == "Save date & time" else field
-                        if field == "Dealer name":
-                            value = "Northside Marine"
-                        if value != "(empty)":
-                            metadata_entries.append((display_field, value))
-                i += 1
-            if comment_value != "(empty)":
-                metadata_entries.append(("Comment", comment_value))
-            if total_engine_hours != "(empty)":
-                metadata_entries.append(("Total Engine Hours", total_engine_hours))
-
-            if metadata_entries:
-                print(f"Creating Metadata table with {len(metadata_entries)} entries")
-                num_rows = (len(metadata_entries) + 1) // 2
-                table = doc.add_table(rows=num_rows, cols=2)
-                table.style = 'Table Grid'
-                remove_all_table_borders(table)  # Remove all borders (no dotted line)
-                table.autofit = True
-                for idx, (field, value) in enumerate(metadata_entries):
-                    row_idx = idx // 2
-                    col_idx = idx % 2
-                    cell = table.cell(row_idx, col_idx)
-                    paragraph = cell.paragraphs[0]
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    run_field = paragraph.add_run(f"{field}: ")
-                    run_field.bold = True
-                    run_field.font.size = Pt(10)
-                    run_value = paragraph.add_run(value)
-                    run_value.bold = False
-                    run_value.font.size = Pt(10)
-                    paragraph.space_after = Pt(2)
-
-        # Main content: Two columns (graphs on left, tables on right)
-        main_table = doc.add_table(rows=2, cols=2)
-        main_table.style = 'Table Grid'
-        remove_all_table_borders(main_table)  # Remove all borders to eliminate lines between graphs and tables
-        main_table.autofit = True
+    Returns (filename, buffer) where buffer is a BytesIO positioned at the start
+    of the saved report. Nothing is written to disk.
+    """
+    report, buffer = _render_to_buffer(lines, output_format)
+    return report_filename(report.customer_name, output_format), buffer
 
-        # Top Left: Engine Operating Hours bar graph
-        cell_top_left = main_table.cell(0, 0)
-        heading_paragraph = cell_top_left.add_paragraph()
-        heading_run = heading_paragraph.add_run("Engine Operating Hours According to Engine Speed")
+def _render_to_buffer(lines, output_format='docx'):
+    """render_report_to_buffer, returning the parsed report instead of the filename: (report, buffer)."""
+    report = read_report(lines)
+    buffer = io.BytesIO()
+    write_report(report, buffer, output_format)
+    buffer.seek(0)
+    return report, buffer
+
+METADATA_KEYS = [
+    "YAMAHA DIAGNOSTIC SYSTEM", "Save date & time", "Customer name",
+    "Dealer name", "Number of engines", "Model name",
+    "Engine serial number (PID number)", "ECM number"
+]
+
+def extract_report_data(report):
+    """Extract exactly what the report tables and charts show from a parsed YdsReport.
+
+    Returns a plain, JSON-serialisable dict that build_report_document and pdf_report.write_pdf render
+    and that the json/columnar output formats return as-is.
+    """
+    metadata = []
+    for field, value in report.metadata.fields:
+        if field in METADATA_KEYS and value:
+            display_field = "Service Date" if field == "Save date & time" else field
+            if field == "Dealer name":
+                value = "Northside Marine"
+            metadata.append({'field': display_field, 'value': value.strip()})
+    if report.metadata.comment:
+        metadata.append({'field': "Comment", 'value': report.metadata.comment})
+    if report.operating_hours.total_hours_text:
+        metadata.append({'field': "Total Engine Hours", 'value': report.operating_hours.total_hours_text})
+
+    operating_hours = [
+        {'speed_range': band, 'hours': hours}
+        for band, hours in zip(report.operating_hours.bands, report.operating_hours.hours)
+        if hours > 0
+    ]
+    oil_exchange = [
+        {'record': record, 'hours': hours}
+        for record, hours in zip(report.oil_exchange.records, report.oil_exchange.hours)
+    ]
+    engine_record = [
+        {'item': record.item, 'value': record.value_text.strip()}
+        for record in report.engine_record if record.value_text.strip()
+    ]
+    engine_monitor = [
+        {'item': monitor.item, 'unit': monitor.unit, 'value': monitor.value_text.strip()}
+        for monitor in report.engine_monitor
+        # Skip items containing A/D(CH1), A/D(CH2), A/D(CH3) in any case
+        if monitor.value_text.strip() and not any(ch in monitor.item.lower() for ch in ["a/d(ch1)", "a/d(ch2)", "a/d(ch3)"])
+    ]
+    diagnosis = [
+        {'item': diagnosis.item, 'status': diagnosis.status, 'code': diagnosis.code}
+        for diagnosis in report.diagnosis if diagnosis.status and diagnosis.code
+    ]
+    return {
+        'customer_name': report.customer_name,
+        'metadata': metadata,
+        'operating_hours': operating_hours,
+        'oil_exchange': oil_exchange,
+        'engine_record': engine_record,
+        'engine_monitor': engine_monitor,
+        'diagnosis': diagnosis if 3 in report.sections_found else None,
+        'health': check_health(report),
+        'data_logs': [extract_data_log(log) for log in report.data_logs],
+    }
+
+def check_health(report):
+    """Run the health check on a parsed report (see health.HealthIndex.check)."""
+    with stage('health'):
+        result = health_index().check(report)
+    metrics.inc('yds_health_checks_total', {'status': result['status']})
+    return result
+
+def extract_data_log(log):
+    """The DATA_LOG_CHARTS channels of one section 7 log, reduced to DATA_LOG_BUCKETS min/max buckets.
+
+    Reduction reads the log in chunks, so memmapped multi-million-row logs stay out of memory.
+    """
+    from decimate import min_max
+
+    def values(array):
+        return [None if math.isnan(v) else v for v in array.tolist()]
+
+    series = []
+    for name, unit in DATA_LOG_CHARTS:
+        for (channel, channel_unit), column in zip(log.channels, log.columns):
+            if channel == name and channel_unit.strip('[]') == unit:
+                times, lows, highs = min_max(log.times, column, DATA_LOG_BUCKETS)
+                series.append({'name': name, 'unit': unit, 'time': values(times), 'min': values(lows), 'max': values(highs)})
+                break
+    return {'position': log.position, 'time_unit': log.time_unit, 'rows': len(log), 'series': series}
+
+def write_columnar(data, output):
+    """Write extracted report data as a compressed NumPy .npz archive, one typed array per table column.
+
+    Arrays are named '<table>.<column>', e.g. 'operating_hours.hours' or 'engine_monitor.item'.
+    Monitor and engine record values are also given as float columns ('value_number', NaN when not numeric).
+    Charted data-log channels are 'data_logs.<log index>.<channel>.<time|min|max>'.
+    The health check is 'health.status' plus one 'health_flags.<key>' column per flag field.
+    """
+    import numpy as np
+
+    columns = {'customer_name': np.array([data['customer_name']])}
+    for table in ('metadata', 'operating_hours', 'oil_exchange', 'engine_record', 'engine_monitor', 'diagnosis'):
+        rows = data[table] or []
+        for key in (rows[0].keys() if rows else ()):
+            columns[f"{table}.{key}"] = np.array([row[key] for row in rows])
+        if table in ('engine_record', 'engine_monitor') and rows:
+            columns[f"{table}.value_number"] = np.array([_as_float(row['value']) for row in rows], dtype=np.float64)
+    columns['health.status'] = np.array([data['health']['status']])
+    flags = data['health']['flags']
+    for key in (flags[0].keys() if flags else ()):
+        columns[f"health_flags.{key}"] = np.array([flag[key] for flag in flags])
+    for i, log in enumerate(data['data_logs']):
+        for series in log['series']:
+            for key in ('time', 'min', 'max'):
+                columns[f"data_logs.{i}.{series['name']}.{key}"] = np.array(series[key], dtype=np.float64)
+    np.savez_compressed(output, **columns)
+
+def _as_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+_report_template = None
+
+def _new_branded_document():
+    """A blank document with the report page margins and the header logo."""
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches
+
+    doc = Document()
+    if app.config['COMPACT_REPORTS']:
+        for rel_id, rel in list(doc.part.rels.items()):
+            if rel.reltype == STYLES_WITH_EFFECTS_RELTYPE:
+                doc.part.drop_rel(rel_id)
+    section = doc.sections[0]
+    section.top_margin = Inches(0.5)
+    section.bottom_margin = Inches(0.5)
+    section.left_margin = Inches(0.5)
+    section.right_margin = Inches(0.5)
+
+    if os.path.exists(LOGO_PATH):
+        header = doc.sections[0].header
+        logo_paragraph = header.add_paragraph()
+        logo_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = logo_paragraph.add_run()
+        logo = io.BytesIO(compact_logo()) if app.config['COMPACT_REPORTS'] else LOGO_PATH
+        run.add_picture(logo, width=Inches(LOGO_WIDTH_INCHES))  # Increased logo size from 3 to 3.5 inches
+        doc.sections[0].header_distance = Inches(0.1)
+    else:
+        logger.error("logo.png not found at %s. Skipping logo.", LOGO_PATH)
+    return doc
+
+_compact_logo = None
+
+def compact_logo():
+    """The header logo as PNG bytes, scaled to COMPACT_LOGO_DPI at its printed width and palette-quantized.
+
+    The source file is several times the resolution the header needs; the
+    optimized copy is made once per process and shared by every document.
+    """
+    from PIL import Image
+
+    global _compact_logo
+    if _compact_logo is None:
+        with Image.open(LOGO_PATH) as image:
+            width = round(LOGO_WIDTH_INCHES * COMPACT_LOGO_DPI)
+            image = image.convert('RGBA').resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        image = image.quantize(COMPACT_COLORS, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+        _compact_logo = buffer.getvalue()
+    return _compact_logo
+
+def _build_report_template():
+    """Build the static part of every report: page setup, header logo and the main layout table."""
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt, RGBColor
+
+    doc = _new_branded_document()
+
+    # Add blank paragraph to create space between header and content
+    spacer_paragraph = doc.add_paragraph()
+    spacer_paragraph.space_after = Pt(20)  # Adds ~20pt (~0.28 inches) of space
+    spacer_paragraph.space_before = Pt(0)   # No extra space above
+
+    # Main content: Two columns (graphs on left, tables on right)
+    main_table = doc.add_table(rows=2, cols=2)
+    main_table.style = 'Table Grid'
+    remove_all_table_borders(main_table)  # Remove all borders to eliminate lines between graphs and tables
+    main_table.autofit = True
+
+    headings = [
+        (main_table.cell(0, 0), "Engine Operating Hours According to Engine Speed"),
+        (main_table.cell(1, 0), "Record of Engine Oil Exchange"),
+    ]
+    # Right Column: Merge the two cells into one for the Engine Record and Engine Monitor tables
+    cell_right = main_table.cell(0, 1).merge(main_table.cell(1, 1))
+    headings.append((cell_right, "Engine Record"))
+    for cell, text in headings:
+        heading_paragraph = cell.add_paragraph()
+        heading_run = heading_paragraph.add_run(text)
         heading_run.bold = True
         heading_run.font.size = Pt(10)
         heading_run.font.color.rgb = RGBColor(0, 0, 0)
         heading_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-        graph_paragraph = cell_top_left.add_paragraph()
-        graph_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        speed_ranges = []
-        hours = []
-        if "1. Engine operating hours according to engine speed" in sections:
-            for row in sections["1. Engine operating hours according to engine speed"]:
-                if len(row) >= 2 and "r/min" in row[0]:
-                    speed_range = row[0].strip('"')
-                    try:
-                        hour = float(row[2].strip('"') if len(row) > 2 and row[2].strip('"') else "0")
-                        if hour > 0:
-                            speed_ranges.append(speed_range)
-                            hours.append(hour)
-                    except ValueError as e:
-                        print(f"Warning: Could not convert '{row[2]}' to float in Section 1: {str(e)}")
-                        continue
+    # The bar graph goes into its own paragraph below the heading
+    graph_paragraph = main_table.cell(0, 0).add_paragraph()
+    graph_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    # Add space between header and table
+    cell_right.add_paragraph()
+    return doc
+
+def new_report_document():
+    """Return a fresh copy of the report template, built once per process."""
+    from docx import Document
+
+    global _report_template
+    if _report_template is None:
+        buffer = io.BytesIO()
+        _build_report_template().save(buffer)
+        # Deep-copy a freshly loaded document: one that has been edited caches wrappers
+        # around sub-elements (e.g. the body), which deepcopy would detach from the copied tree.
+        _report_template = Document(io.BytesIO(buffer.getvalue()))
+    return copy.deepcopy(_report_template)
+
+def build_report_document(report, data=None):
+    """Assemble the Word report for a parsed YdsReport and return the Document.
+
+    data is the report's extract_report_data dict, if the caller already has it.
+    """
+    with stage('docx_build'):
+        return _build_report_document(report, data)
+
+def _build_report_document(report, data):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches, Pt, RGBColor
+
+    try:
+        if data is None:
+            data = extract_report_data(report)
+        doc = new_report_document()
+        main_table = doc.tables[0]
+
+        # Metadata section (center-aligned, no borders, larger text, no dotted line)
+        metadata_entries = [(entry['field'], entry['value']) for entry in data['metadata']]
+        if metadata_entries:
+            num_rows = (len(metadata_entries) + 1) // 2
+            table = doc.add_table(rows=num_rows, cols=2)
+            main_table._tbl.addprevious(table._tbl)  # The template's main table must stay below the metadata
+            table.style = 'Table Grid'
+            remove_all_table_borders(table)  # Remove all borders (no dotted line)
+            table.autofit = True
+            for idx, (field, value) in enumerate(metadata_entries):
+                row_idx = idx // 2
+                col_idx = idx % 2
+                cell = table.cell(row_idx, col_idx)
+                paragraph = cell.paragraphs[0]
+                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                run_field = paragraph.add_run(f"{field}: ")
+                run_field.bold = True
+                run_field.font.size = Pt(10)
+                run_value = paragraph.add_run(value)
+                run_value.bold = False
+                run_value.font.size = Pt(10)
+                paragraph.space_after = Pt(2)
+
+        # Main content: Two columns (graphs on left, tables on right), laid out by the template
+        # Top Left: Engine Operating Hours bar graph
+        cell_top_left = main_table.cell(0, 0)
+        graph_paragraph = cell_top_left.paragraphs[-1]
+        speed_ranges = [entry['speed_range'] for entry in data['operating_hours']]
+        hours = [entry['hours'] for entry in data['operating_hours']]
 
         if speed_ranges and hours:
-            graph_path = os.path.join(output_dir, "engine_hours_graph.png")
-            create_bar_graph(speed_ranges, hours, graph_path)
+            graph_image = io.BytesIO()
+            create_bar_graph(speed_ranges, hours, graph_image)
+            graph_image.seek(0)
             run = graph_paragraph.add_run()
-            run.add_picture(graph_path, width=Inches(3.5), height=Inches(4.0))
-            os.remove(graph_path)
+            run.add_picture(graph_image, width=Inches(3.5), height=Inches(4.0))
         else:
             cell_top_left.add_paragraph("No significant operating hours to display.")
 
         # Bottom Left: Engine Oil Exchange line graph
         cell_bottom_left = main_table.cell(1, 0)
-        heading_paragraph = cell_bottom_left.add_paragraph()
-        heading_run = heading_paragraph.add_run("Record of Engine Oil Exchange")
-        heading_run.bold = True
-        heading_run.font.size = Pt(10)
-        heading_run.font.color.rgb = RGBColor(0, 0, 0)
-        heading_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-        times = []
-        hours = []
-        if "2. Record of engine oil exchange" in sections:
-            for row in sections["2. Record of engine oil exchange"]:
-                if len(row) >= 2 and row[0].strip('"') != "Time" and row[0].strip('"'):
-                    time = row[0].strip('"')
-                    data = row[2].strip('"') if len(row) > 2 and row[2].strip('"') else "(empty)"
-                    if data != "(empty)":
-                        try:
-                            times.append(int(time))
-                            hours.append(float(data))
-                        except ValueError as e:
-                            print(f"Warning: Could not convert time '{time}' or hours '{data}' to number: {str(e)}")
-                            continue
+        times = [entry['record'] for entry in data['oil_exchange']]
+        hours = [entry['hours'] for entry in data['oil_exchange']]
 
         if times and hours:
-            line_graph_path = os.path.join(output_dir, "engine_oil_exchange_graph.png")
-            create_line_graph(times, hours, line_graph_path)
+            line_graph_image = io.BytesIO()
+            create_line_graph(times, hours, line_graph_image)
+            line_graph_image.seek(0)
             graph_paragraph = cell_bottom_left.add_paragraph()
             graph_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
             run = graph_paragraph.add_run()
-            run.add_picture(line_graph_path, width=Inches(3.5), height=Inches(2.5))
-            os.remove(line_graph_path)
+            run.add_picture(line_graph_image, width=Inches(3.5), height=Inches(2.5))
         else:
             no_data_paragraph = cell_bottom_left.add_paragraph("No engine oil exchange records to display.")
             no_data_paragraph.runs[0].font.size = Pt(8)
             no_data_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-        # Right Column: Merge the two cells and add Engine Record and Engine Monitor tables
-        cell_top_right = main_table.cell(0, 1)
-        cell_bottom_right = main_table.cell(1, 1)
-        cell_top_right.merge(cell_bottom_right)  # Merge the two cells into one
-        cell_right = cell_top_right  # Use the merged cell
-
-        # Engine Record Section
-        heading_paragraph = cell_right.add_paragraph()
-        heading_run = heading_paragraph.add_run("Engine Record")
-        heading_run.bold = True
-        heading_run.font.size = Pt(10)
-        heading_run.font.color.rgb = RGBColor(0, 0, 0)
-        heading_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-        # Add space between header and table
-        cell_right.add_paragraph()
+        # Right Column: merged cell holding the Engine Record and Engine Monitor tables
+        cell_right = main_table.cell(0, 1)
 
-        has_data = False
-        table_data = []
-        if "6. Engine record" in sections:
-            for row in sections["6. Engine record"]:
-                if len(row) >= 1 and row[0].strip('"') != "Data item" and row[0].strip('"') != "6. Engine record" and row[0].strip('"'):
-                    item = row[0].strip('"')
-                    value = row[2].strip('"') if len(row) > 2 and row[2].strip('"') else row[1].strip('"') if len(row) > 1 and row[1].strip('"') else "(empty)"
-                    if item != "(empty)" and value != "(empty)" and value.strip():  # Only include if value exists
-                        table_data.append((item, value))
-                        has_data = True
+        table_data = [(entry['item'], entry['value']) for entry in data['engine_record']]
+        has_data = bool(table_data)
 
         if has_data:
             sub_table = cell_right.add_table(rows=1, cols=2)
@@ -390,25 +713,8 @@ def process_csv_to_tables(file_path, output_dir):
         # Add space between header and table
         cell_right.add_paragraph()
 
-        has_data = False
-        table_data = []
-        stop_adding = False
-        if "4. Engine monitor" in sections:
-            for row in sections["4. Engine monitor"]:
-                if len(row) >= 5 and row[0].strip('"') and not row[0].startswith("Monitor item") and not row[0].startswith("4. Engine monitor"):
-                    item = row[0].strip('"')
-                    if item.lower() == "engine shut off switch":
-                        stop_adding = True
-                        break
-                    if stop_adding:
-                        continue
-                    # Skip items containing A/D(CH1), A/D(CH2), A/D(CH3) in any case
-                    if any(ch in item.lower() for ch in ["a/d(ch1)", "a/d(ch2)", "a/d(ch3)"]):
-                        continue
-                    value = row[4].strip('"') if len(row) > 4 else row[2].strip('"')
-                    if value != "(empty)" and value.strip():  # Only include if value exists
-                        table_data.append((item, value))
-                        has_data = True
+        table_data = [(entry['item'], entry['value']) for entry in data['engine_monitor']]
+        has_data = bool(table_data)
 
         if has_data:
             sub_table = cell_right.add_table(rows=1, cols=2)
@@ -439,26 +745,22 @@ def process_csv_to_tables(file_path, output_dir):
 
         doc.add_paragraph()
 
+        # Health check: out-of-range values and active faults
+        from health import flag_status_text
+
+        _add_heading(doc, "Health Check")
+        _add_data_table(doc, ["Section", "Item", "Value", "Expected", "Status"], [
+            (flag['section'], flag['item'], flag['value'], flag['expected'], flag_status_text(flag))
+            for flag in data['health']['flags']
+        ], "All checked values are within range and no faults are active.")
+        doc.add_paragraph()
+
         # Diagnosis section
-        if "3. Diagnosis" in sections:
-            print("Processing Diagnosis section...")
-            heading_paragraph = doc.add_paragraph()
-            heading_run = heading_paragraph.add_run("Diagnosis")
-            heading_run.bold = True
-            heading_run.font.size = Pt(10)
-            heading_run.font.color.rgb = RGBColor(0, 0, 0)
-            heading_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-            has_data = False
-            table_data = []
-            for row in sections["3. Diagnosis"]:
-                if len(row) >= 3 and row[2].strip('"').isdigit():
-                    item = row[0].strip('"')
-                    status = row[1].strip('"')
-                    code = row[2].strip('"')
-                    if status != "(empty)" and code != "(empty)" and status.strip() and code.strip():  # Only include if both values exist
-                        table_data.append((item, status, code))
-                        has_data = True
+        if data['diagnosis'] is not None:
+            _add_heading(doc, "Diagnosis")
+
+            table_data = [(entry['item'], entry['status'], entry['code']) for entry in data['diagnosis']]
+            has_data = bool(table_data)
 
             if has_data:
                 table = doc.add_table(rows=1, cols=3)
@@ -481,24 +783,371 @@ def process_csv_to_tables(file_path, output_dir):
                 doc.add_paragraph("No diagnosis records to display.")
             doc.add_paragraph()
 
-        print(f"Saving Word document to {output_file}")
-        doc.save(output_file)
-        return output_file
+        # Data comparison graph: one chart per charted channel of each engine position's log
+        for log in data['data_logs']:
+            if not log['series']:
+                continue
+            _add_heading(doc, f"Data Comparison Graph ({log['position']})" if log['position'] else "Data Comparison Graph")
+            for series in log['series']:
+                series_image = io.BytesIO()
+                create_series_graph(series, log['time_unit'], series_image)
+                series_image.seek(0)
+                graph_paragraph = doc.add_paragraph()
+                graph_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                graph_paragraph.add_run().add_picture(series_image, width=Inches(6.5), height=Inches(2.2))
 
-    except Exception as e:
-        print(f"An error occurred in process_csv_to_tables: {str(e)}")
+        return doc
+
+    except Exception:
+        logger.exception("An error occurred in build_report_document")
         raise
 
+def run_report_job(upload_path, output_dir, cache_key=None, request_id=None):
+    """Job-queue entry point: build the report for one upload, then discard the upload.
+
+    Runs in a pool worker; request_id ties its log lines to the request that queued it.
+    """
+    start = time.perf_counter()
+    size = None
+    with app_logging.request_context(request_id or app_logging.new_request_id()) as timings:
+        try:
+            output_file, report, _ = _process_csv(upload_path, output_dir)
+            if cache_key:
+                report_cache.put(cache_key, output_file, report.customer_name)
+            size = os.path.getsize(output_file)
+            metrics.observe('yds_output_bytes', size, {'format': 'docx'})
+            return {'filename': os.path.basename(output_file), 'size': size}
+        finally:
+            # The upload sits alone in its workspace's upload directory
+            with stage('cleanup'):
+                shutil.rmtree(os.path.dirname(upload_path), ignore_errors=True)
+            logger.info("Report job finished", extra={
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2), 'output_bytes': size, 'stages': timings})
+            metrics.observe_stages(timings)
+            # Pool workers are not request-driven; publish now rather than on the next timer tick
+            metrics.flush()
+
+def _process_batch_item(job):
+    """Worker entry point for process_csv_batch; never raises so one bad file can't sink the batch."""
+    file_path, output_dir = job
+    try:
+        output_file, _, data = _process_csv(file_path, output_dir)
+        health = data['health']
+        return {'success': True, 'output_file': output_file,
+                'health': {'status': health['status'], 'flags': health['flags']}}
+    except Exception as e:
+        return {'success': False, 'message': str(e)}
+
+def process_csv_batch(file_paths, output_dir, max_workers=None):
+    """Generate a report for every CSV in file_paths and bundle them into a single zip.
+
+    Files are processed on the job queue's process pool, at most max_workers
+    (capped at the pool's size) at a time, so concurrent batches share a fixed
+    set of processes (max_workers=1 processes them in the calling process
+    instead). Each file gets its own working directory so reports for the same customer (twin/triple rigs) and
+    the intermediate chart images never collide. Returns (zip_path, results)
+    where results holds one status dict per input file, in input order; each
+    successful one carries its health check status and flags.
+    """
+    if not file_paths:
+        raise ValueError("No CSV files to process")
+
+    batch_id = uuid.uuid4().hex[:12]
+    batch_dir = os.path.join(output_dir, f"batch_{batch_id}")
+    jobs = []
+    for i, file_path in enumerate(file_paths):
+        item_dir = os.path.join(batch_dir, str(i))
+        os.makedirs(item_dir, exist_ok=True)
+        jobs.append((file_path, item_dir))
+
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs), job_queue.max_workers))
+    logger.info("Processing batch %s: %d file(s) across %d worker(s)", batch_id, len(jobs), max_workers)
+    if max_workers == 1:
+        outcomes = [_process_batch_item(job) for job in jobs]
+    else:
+        # A pool process that dies (e.g. out of memory) fails its file, not the batch
+        outcomes = job_queue.map(_process_batch_item, jobs, limit=max_workers,
+                                 on_error=lambda job, e: {'success': False, 'message': failure_message(e)})
+
+    today = datetime.now().strftime("%d-%m-%y")
+    zip_path = os.path.join(output_dir, f"Yamaha_Diagnostics_Reports_{today}_{batch_id}.zip")
+    results = []
+    used_names = set()
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for file_path, outcome in zip(file_paths, outcomes):
+            result = {'file': os.path.basename(file_path), 'success': outcome['success']}
+            if outcome['success']:
+                report_name = os.path.basename(outcome['output_file'])
+                stem, ext = os.path.splitext(report_name)
+                n = 2
+                while report_name in used_names:
+                    report_name = f"{stem}_{n}{ext}"
+                    n += 1
+                used_names.add(report_name)
+                zf.write(outcome['output_file'], report_name)
+                result['report'] = report_name
+                result['health'] = outcome['health']
+            else:
+                logger.warning("Batch %s: failed to process %s: %s", batch_id, file_path, outcome['message'])
+                result['message'] = outcome['message']
+            results.append(result)
+
+    shutil.rmtree(batch_dir, ignore_errors=True)
+    return zip_path, results
+
+def _batch_upload_path(upload_dir, index, name):
+    # One sub-directory per file keeps the original name while allowing duplicates
+    item_dir = os.path.join(upload_dir, str(index))
+    os.makedirs(item_dir, exist_ok=True)
+    return os.path.join(item_dir, name)
+
+def _copy_zip_member(src, dst, limit):
+    """Copy a zip member, refusing to write more than limit (its declared size) bytes."""
+    written = 0
+    while True:
+        chunk = src.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            return
+        written += len(chunk)
+        if written > limit:
+            raise ValueError("A zip member is larger than its declared size.")
+        dst.write(chunk)
+
+def _extract_batch_uploads(files, upload_dir, max_files):
+    """Save uploaded CSVs (and the CSV members of any uploaded zip) into upload_dir.
+
+    Zip archives are checked before anything is extracted: the upload is refused
+    with ValueError when it holds more than max_files CSVs or when the members'
+    declared sizes add up to more than BATCH_MAX_UNCOMPRESSED_SIZE.
+    """
+    max_bytes = app.config['BATCH_MAX_UNCOMPRESSED_SIZE']
+    paths = []
+    total_bytes = 0
+    for file in files:
+        name = secure_filename(file.filename) or 'upload'
+        if name.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(file.stream) as zf:
+                    members = []
+                    for member in zf.infolist():
+                        member_name = secure_filename(os.path.basename(member.filename))
+                        if not member.is_dir() and member_name.lower().endswith('.csv'):
+                            members.append((member, member_name))
+                    total_bytes += sum(member.file_size for member, _ in members)
+                    if len(paths) + len(members) > max_files:
+                        raise ValueError(f"Too many files. Maximum is {max_files} per upload.")
+                    if total_bytes > max_bytes:
+                        raise ValueError(f"Upload too large once extracted. Maximum is {max_bytes // (1024 * 1024)}MB.")
+                    for member, member_name in members:
+                        path = _batch_upload_path(upload_dir, len(paths), member_name)
+                        with zf.open(member) as src, open(path, 'wb') as dst:
+                            _copy_zip_member(src, dst, member.file_size)
+                        paths.append(path)
+            except zipfile.BadZipFile:
+                raise ValueError(f"{file.filename} is not a valid zip archive.")
+        elif name.lower().endswith('.csv'):
+            if len(paths) + 1 > max_files:
+                raise ValueError(f"Too many files. Maximum is {max_files} per upload.")
+            path = _batch_upload_path(upload_dir, len(paths), name)
+            file.save(path)
+            paths.append(path)
+        else:
+            raise ValueError(f"{file.filename} is not a CSV or zip file.")
+    return paths
+
+def _add_heading(doc, text):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt, RGBColor
+
+    heading_paragraph = doc.add_paragraph()
+    heading_run = heading_paragraph.add_run(text)
+    heading_run.bold = True
+    heading_run.font.size = Pt(10)
+    heading_run.font.color.rgb = RGBColor(0, 0, 0)
+    heading_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+def _add_data_table(doc, headers, rows, empty_message):
+    from docx.shared import Pt
+
+    if not rows:
+        doc.add_paragraph(empty_message)
+        return
+    table = doc.add_table(rows=1, cols=len(headers))
+    table.style = 'Table Grid'
+    remove_table_outer_borders(table)
+    table.autofit = True
+    for cell, text in zip(table.rows[0].cells, headers):
+        cell.text = text
+        cell.paragraphs[0].runs[0].bold = True
+        cell.paragraphs[0].runs[0].font.size = Pt(8)
+    for row in rows:
+        for cell, value in zip(table.add_row().cells, row):
+            cell.text = '' if value is None else str(value)
+            cell.paragraphs[0].runs[0].font.size = Pt(8)
+
+def build_fleet_document(summary):
+    """Assemble the fleet rollup Word report for a summary from fleet.summarize."""
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches, Pt
+
+    doc = _new_branded_document()
+    fleet_totals = summary['fleet']
+    oil = fleet_totals['oil_exchange']
+
+    title = doc.add_paragraph()
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    title_run = title.add_run("Fleet Diagnostics Summary")
+    title_run.bold = True
+    title_run.font.size = Pt(14)
+
+    overview = [
+        ("Report Date", datetime.now().strftime("%d-%m-%y")),
+        ("Customers", fleet_totals['customers']),
+        ("Engines", fleet_totals['engines']),
+        ("Total Engine Hours", fleet_totals['total_hours']),
+        ("Mean Oil Exchange Interval", oil['mean_interval']),
+        ("Median Oil Exchange Interval", oil['median_interval']),
+        ("Engines Needing Attention", fleet_totals['engines_needing_attention']),
+    ]
+    _add_data_table(doc, ["Field", "Value"], overview, "")
+    doc.add_paragraph()
+
+    _add_heading(doc, "Engine Operating Hours According to Engine Speed (All Engines)")
+    bands = [(entry['speed_range'], entry['hours']) for entry in fleet_totals['operating_hours'] if entry['hours']]
+    if bands:
+        graph_image = io.BytesIO()
+        create_bar_graph([band for band, _ in bands], [hours for _, hours in bands], graph_image)
+        graph_image.seek(0)
+        doc.add_paragraph().add_run().add_picture(graph_image, width=Inches(4.5))
+    else:
+        doc.add_paragraph("No significant operating hours to display.")
+
+    _add_heading(doc, "Customers")
+    _add_data_table(doc, ["Customer", "Engines", "Total Hours", "Mean Oil Interval", "Fault Occurrences"], [
+        (c['customer_name'], c['engines'], c['total_hours'], c['mean_oil_interval'], c['fault_occurrences'])
+        for c in summary['customers']
+    ], "No customers to display.")
+    doc.add_paragraph()
+
+    _add_heading(doc, "Diagnosis Code Frequency")
+    _add_data_table(doc, ["Code", "Item", "Occurrences", "Engines"], [
+        (d['code'], d['item'], d['occurrences'], d['engines']) for d in fleet_totals['diagnosis_codes']
+    ], "No diagnosis records to display.")
+    doc.add_paragraph()
+
+    _add_heading(doc, "Engines")
+    _add_data_table(doc, ["Customer", "Engine", "Total Hours", "Oil Exchanges", "Mean Oil Interval", "Hours Since Oil Exchange", "Faults", "Health"], [
+        (e['customer_name'], e['engine_id'], e['total_hours'], e['oil_exchanges'], e['mean_oil_interval'],
+         e['hours_since_oil_exchange'], e['fault_occurrences'],
+         f"Attention ({len(e['health']['flags'])})" if e['health']['flags'] else "OK")
+        for e in summary['engines']
+    ], "No engines to display.")
+    doc.add_paragraph()
+
+    from health import flag_status_text
+
+    _add_heading(doc, "Health Flags")
+    _add_data_table(doc, ["Customer", "Engine", "Item", "Value", "Expected", "Status"], [
+        (e['customer_name'], e['engine_id'], flag['item'], flag['value'], flag['expected'], flag_status_text(flag))
+        for e in summary['engines'] for flag in e['health']['flags']
+    ], "All engines are within range with no active faults.")
+
+    if summary['errors']:
+        doc.add_paragraph()
+        _add_heading(doc, "Exports Not Included")
+        _add_data_table(doc, ["File", "Reason"], [(e['file'], e['message']) for e in summary['errors']], "")
+    return doc
+
+def process_fleet(source, output_dir, output_format='docx'):
+    """Build one fleet rollup report from every export under source (CSV paths, directories or zips).
+
+    Returns (output_file, summary). output_format is 'docx' or 'json'.
+    """
+    import fleet
+
+    reports, errors = fleet.load_exports(source)
+    if not reports:
+        raise ValueError("No readable CSV exports found")
+    with stage('history'):
+        for name, report in reports:
+            engine_history.record(report, name)
+    summary = fleet.summarize(reports, errors, health_index())
+    logger.info("Fleet rollup: %d engine(s) from %d export(s), %d unreadable",
+                summary['fleet']['engines'], len(reports), len(errors))
+    today = datetime.now().strftime("%d-%m-%y")
+    output_file = os.path.join(output_dir, f"Yamaha_Fleet_Summary_{today}.{OUTPUT_FORMATS[output_format][0]}")
+    if output_format == 'json':
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f)
+    elif output_format == 'docx':
+        build_fleet_document(summary).save(output_file)
+    else:
+        raise ValueError(f"Unsupported fleet output format: {output_format}")
+    return output_file, summary
+
 # Flask routes
+@app.before_request
+def start_workspace_sweeper():
+    workspace_sweeper.ensure_started()
+
+@app.before_request
+def begin_request_log():
+    g.request_id = app_logging.new_request_id(request.headers.get('X-Request-ID'))
+    g.request_log = app_logging.begin_request(g.request_id)
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    if 'request_log' in g:
+        response.headers['X-Request-ID'] = g.request_id
+        duration = time.perf_counter() - g.request_start
+        timings = app_logging.current_timings()
+        logger.info("Request finished", extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'stages': timings,
+        })
+        app_logging.end_request(g.pop('request_log'))
+
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.inc('yds_http_requests_total', {'endpoint': endpoint, 'method': request.method, 'status': response.status_code})
+        metrics.observe('yds_http_request_duration_seconds', duration, {'endpoint': endpoint})
+        metrics.observe_stages(timings)
+        if request.method == 'POST' and request.content_length:
+            metrics.observe('yds_upload_bytes', request.content_length, {'endpoint': endpoint})
+    return response
+
+@app.teardown_request
+def end_request_log(exc):
+    # Only reached with the context still open when the view raised before after_request ran
+    if 'request_log' in g:
+        app_logging.end_request(g.pop('request_log'))
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    max_mb = request.max_content_length // (1024 * 1024)
+    return jsonify({'success': False, 'message': f'Upload too large. Maximum size is {max_mb}MB.'}), 400
+
 @app.route('/process', methods=['POST'])
 def process():
-    max_file_size = 5 * 1024 * 1024
-    if int(request.headers.get('Content-Length', 0)) > max_file_size:
-        return jsonify({'success': False, 'message': 'File too large. Maximum size is 5MB.'}), 400
+    # ?delivery=inline returns the .docx in this response, built without touching disk.
+    # The CSV may be posted as the raw body (text/csv) or as the usual 'file' form field.
+    # Raw streamed bodies are parsed as they arrive and so bypass the report cache.
+    # ?format=json|columnar returns just the extracted table data, always inline and uncached;
+    # no charts or Word document are produced. ?format=pdf returns the report as a PDF, also inline
+    # and uncached, rendered directly rather than converted from the .docx.
+    output_format = request.args.get('format', 'docx')
+    if output_format not in OUTPUT_FORMATS:
+        return jsonify({'success': False, 'message': f"Unknown format. Use one of: {', '.join(OUTPUT_FORMATS)}."}), 400
+    inline = request.args.get('delivery') == 'inline' or output_format != 'docx'
+    if inline and request.mimetype == 'text/csv':
+        return process_inline(io.BufferedReader(WsgiInput(request.stream)), output_format=output_format)
 
     if 'file' not in request.files:
         return jsonify({'success': False, 'message': 'No file part in the request.'}), 400
@@ -508,48 +1157,239 @@ def process():
         return jsonify({'success': False, 'message': 'No file selected.'}), 400
 
     if file and file.filename.endswith('.csv'):
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], 'uploaded.csv')
-        print(f"Saving uploaded file to: {upload_path}")
-        file.save(upload_path)
+        cache_key = None
+        cached = None
+        if output_format != 'docx':
+            return process_inline(file.stream, output_format=output_format)
+        if app.config['REPORT_CACHE_ENABLED']:
+            cache_key = report_cache.key_stream(file.stream)
+            file.stream.seek(0)
+            cached = report_cache.get(cache_key)
+            metrics.inc('yds_report_cache_total', {'result': 'hit' if cached else 'miss'})
+            logger.debug("Report cache %s for %s", 'hit' if cached else 'miss', cache_key)
+
+        if inline:
+            if cached:
+                response = send_file(cached[0], mimetype=DOCX_MIMETYPE, as_attachment=True,
+                                     download_name=report_filename(cached[1]))
+                response.headers['X-Report-Cache'] = 'hit'
+                return response
+            return process_inline(file.stream, cache_key)
+
+        workspace = new_workspace()
+        job_id = workspace.id
+        if cached:
+            cached_path, customer_name = cached
+            output_filename = report_filename(customer_name)
+            output_file = os.path.join(workspace.output_dir, output_filename)
+            try:
+                os.link(cached_path, output_file)
+            except OSError:
+                shutil.copyfile(cached_path, output_file)
+            job_queue.complete(job_id, {'filename': output_filename, 'size': os.path.getsize(output_file)})
+            download_url = url_for('download_file', job_id=job_id, filename=output_filename)
+            return jsonify({'success': True, 'job_id': job_id, 'download_url': download_url, 'cache': 'hit'})
+
+        upload_path = workspace.upload_path('uploaded.csv')
+        with stage('upload_save'):
+            file.save(upload_path)
 
         try:
-            output_file = process_csv_to_tables(upload_path, app.config['DOWNLOAD_FOLDER'])
-            output_filename = os.path.basename(output_file)
-
-            print(f"Cleaning up old files in {app.config['DOWNLOAD_FOLDER']}")
-            for f in os.listdir(app.config['DOWNLOAD_FOLDER']):
-                f_path = os.path.join(app.config['DOWNLOAD_FOLDER'], f)
-                if f_path != output_file:
-                    try:
-                        if os.path.isfile(f_path):
-                            os.remove(f_path)
-                            print(f"Removed old file: {f_path}")
-                    except Exception as e:
-                        print(f"Error removing old file {f_path}: {str(e)}")
-
-            print(f"Removing uploaded file: {upload_path}")
-            os.remove(upload_path)
-
-            download_url = url_for('download_file', filename=urllib.parse.quote(output_filename))
-            print(f"Generated download URL: {download_url}")
-            return jsonify({'success': True, 'download_url': download_url})
+            job_queue.submit(run_report_job, upload_path, workspace.output_dir, cache_key,
+                             app_logging.get_request_id(), job_id=job_id)
+        except QueueFullError as e:
+            logger.warning("Rejecting upload: %s", e)
+            metrics.inc('yds_jobs_rejected_total')
+            workspace.discard_uploads()
+            response = jsonify({'success': False, 'message': 'The server is busy. Please try again in a moment.'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
         except Exception as e:
-            print(f"Error in /process endpoint: {str(e)}")
+            logger.exception("Error in /process endpoint")
+            workspace.discard_uploads()
             return jsonify({'success': False, 'message': f"Error processing file: {str(e)}"}), 500
+
+        status_url = url_for('job_status', job_id=job_id)
+        return jsonify({'success': True, 'job_id': job_id, 'status_url': status_url, 'cache': 'miss'}), 202
     else:
         return jsonify({'success': False, 'message': 'Please upload a valid CSV file.'}), 400
 
-@app.route('/download/<filename>')
-def download_file(filename):
-    file_path = os.path.join(app.config['DOWNLOAD_FOLDER'], filename)
-    print(f"Serving file for download: {file_path}")
-    return send_file(file_path, as_attachment=True)
+def process_inline(stream, cache_key=None, output_format='docx'):
+    try:
+        lines = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        parsed, report = _render_to_buffer(lines, output_format)
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logger.warning("Error in /process endpoint: %s", e)
+        return jsonify({'success': False, 'message': f"Error processing file: {str(e)}"}), 500
+    output_filename = report_filename(parsed.customer_name, output_format)
+    metrics.observe('yds_output_bytes', report.getbuffer().nbytes, {'format': output_format})
+    if output_format == 'json':
+        return app.response_class(report.getvalue(), mimetype='application/json')
+    if cache_key:
+        report_cache.put_bytes(cache_key, parsed.customer_name, report.getvalue())
+    response = send_file(report, mimetype=OUTPUT_FORMATS[output_format][1], as_attachment=True, download_name=output_filename)
+    if output_format == 'docx':
+        response.headers['X-Report-Cache'] = 'miss'
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown job.'}), 404
+
+    payload = {'success': job['status'] != 'failed', 'job_id': job_id, 'status': job['status']}
+    if job['status'] == 'done':
+        payload['download_url'] = url_for('download_file', job_id=job_id, filename=job['result']['filename'])
+        if 'size' in job['result']:
+            payload['size'] = job['result']['size']
+    elif job['status'] == 'failed':
+        payload['message'] = f"Error processing file: {job['message']}"
+    return jsonify(payload)
+
+@app.route('/process/batch', methods=['POST'])
+def process_batch():
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'success': False, 'message': 'No files selected.'}), 400
+
+    workspace = new_workspace()
+    try:
+        try:
+            file_paths = _extract_batch_uploads(files, workspace.upload_dir, app.config['BATCH_MAX_FILES'])
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        if not file_paths:
+            return jsonify({'success': False, 'message': 'No CSV files found in the upload.'}), 400
+
+        zip_path, results = process_csv_batch(file_paths, workspace.output_dir, app.config['BATCH_MAX_WORKERS'])
+        metrics.observe('yds_output_bytes', os.path.getsize(zip_path), {'format': 'zip'})
+        job_queue.complete(workspace.id, {'filename': os.path.basename(zip_path)})
+        download_url = url_for('download_file', job_id=workspace.id, filename=os.path.basename(zip_path))
+        return jsonify({
+            'success': any(r['success'] for r in results),
+            'download_url': download_url,
+            'results': results,
+        })
+    except Exception as e:
+        logger.exception("Error in /process/batch endpoint")
+        return jsonify({'success': False, 'message': f"Error processing batch: {str(e)}"}), 500
+    finally:
+        with stage('cleanup'):
+            workspace.discard_uploads()
+
+@app.route('/process/fleet', methods=['POST'])
+def process_fleet_upload():
+    output_format = request.args.get('format', 'docx')
+    if output_format not in ('docx', 'json'):
+        return jsonify({'success': False, 'message': 'Unknown format. Use one of: docx, json.'}), 400
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'success': False, 'message': 'No files selected.'}), 400
+
+    workspace = new_workspace()
+    try:
+        try:
+            file_paths = _extract_batch_uploads(files, workspace.upload_dir, app.config['FLEET_MAX_FILES'])
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        if not file_paths:
+            return jsonify({'success': False, 'message': 'No CSV files found in the upload.'}), 400
+
+        output_file, summary = process_fleet(file_paths, workspace.output_dir, output_format)
+        if output_format == 'json':
+            return jsonify(summary)
+        job_queue.complete(workspace.id, {'filename': os.path.basename(output_file)})
+        download_url = url_for('download_file', job_id=workspace.id, filename=os.path.basename(output_file))
+        return jsonify({'success': True, 'download_url': download_url, 'fleet': {
+            key: summary['fleet'][key] for key in ('customers', 'engines', 'total_hours')
+        }, 'errors': summary['errors']})
+    except Exception as e:
+        logger.exception("Error in /process/fleet endpoint")
+        return jsonify({'success': False, 'message': f"Error processing fleet: {str(e)}"}), 500
+    finally:
+        with stage('cleanup'):
+            workspace.discard_uploads()
+
+@app.route('/download/<job_id>/<filename>')
+def download_file(job_id, filename):
+    # Only the file recorded for a finished job is served; everything else in the folder is private
+    job = job_queue.get(job_id) if is_workspace_id(job_id) else None
+    if job is None or job['status'] != 'done' or job['result']['filename'] != filename:
+        return "Report not found", 404
+    file_path = os.path.join(app.config['DOWNLOAD_FOLDER'], job_id, filename)
+    if not os.path.isfile(file_path):
+        return "Report not found", 404
+    logger.debug("Serving file for download: %s", file_path)
+    return send_download(file_path)
+
+def send_download(file_path):
+    """Send a finished report with validators, a private max-age and Range support.
+
+    With DOWNLOAD_SENDFILE set, Python only answers conditional requests and the
+    reverse proxy streams the body (and serves any Range), so a slow client
+    doesn't hold a gunicorn worker for the length of the transfer.
+    """
+    handoff = app.config['DOWNLOAD_SENDFILE']
+    response = send_file_from(
+        file_path, request.environ, as_attachment=True, use_x_sendfile=bool(handoff),
+        response_class=app.response_class, max_age=app.config['DOWNLOAD_MAX_AGE'], conditional=not handoff,
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    if handoff:
+        response = response.make_conditional(request.environ)
+        del response.headers['X-Sendfile']
+        if response.status_code == 200 and handoff == 'x-accel-redirect':
+            relative = os.path.relpath(file_path, app.config['DOWNLOAD_FOLDER'])
+            response.headers['X-Accel-Redirect'] = app.config['DOWNLOAD_ACCEL_PREFIX'] + urllib.parse.quote(relative)
+        elif response.status_code == 200:
+            response.headers['X-Sendfile'] = file_path
+    return response
+
+@app.route('/engines')
+def list_engines():
+    try:
+        return jsonify({'engines': engine_history.engines()})
+    except HistoryUnavailableError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+
+@app.route('/engines/<engine_id>')
+def engine_history_view(engine_id):
+    try:
+        history = engine_history.engine_history(engine_id)
+    except HistoryUnavailableError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    if history is None:
+        return jsonify({'success': False, 'message': 'Unknown engine.'}), 404
+    return jsonify(history)
+
+_disk_usage = {'at': 0, 'values': {}}
+
+def disk_usage_gauges():
+    """Bytes under each working directory, recomputed at most every 15 seconds."""
+    if time.time() - _disk_usage['at'] > 15:
+        _disk_usage['values'] = {
+            metrics.gauge_key('yds_disk_usage_bytes', {'dir': name}): directory_size(app.config[key])
+            for name, key in (('uploads', 'UPLOAD_FOLDER'), ('downloads', 'DOWNLOAD_FOLDER'),
+                              ('jobs', 'JOBS_FOLDER'), ('report_cache', 'CACHE_FOLDER'))
+        }
+        _disk_usage['at'] = time.time()
+    return _disk_usage['values']
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics.enabled:
+        return "Metrics are disabled", 404
+    return app.response_class(metrics.render(disk_usage_gauges()), mimetype='text/plain; version=0.0.4')
 
 @app.route('/logo')
 def serve_logo():
-    logo_path = os.path.join(os.path.dirname(__file__), "newlogo.png")
-    if os.path.exists(logo_path):
-        return send_file(logo_path, mimetype='image/png')
+    if os.path.exists(LOGO_PATH):
+        return send_file(LOGO_PATH, mimetype='image/png')
     else:
         return "Logo not found", 404
 
@@ -0,0 +1,145 @@
+"""Logging setup: leveled, structured log lines tagged with a request ID, plus per-stage timings.
+
+configure() installs one stderr handler on the root logger. LOG_LEVEL picks the
+level (INFO by default, so debug output is off) and LOG_FORMAT picks 'text'
+(one line, extra fields as key=value) or 'json' (one JSON object per line, for
+log drains). Fields passed with extra={...} are included either way.
+
+Work done for one request runs inside request_context(), and each step of it
+inside stage('name'). The accumulated stage durations are returned when the
+context ends, so a single summary line can report where the time went:
+
+    with request_context(request_id) as timings:
+        with stage('parse'):
+            ...
+    logger.info("request finished", extra={'stages': timings})
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Libraries whose debug output would drown ours when LOG_LEVEL=DEBUG
+QUIET_LOGGERS = ('matplotlib', 'PIL')
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_timings = contextvars.ContextVar('timings', default=None)
+
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'taskName'}
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={json.dumps(value, default=str)}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': record.request_id,
+            'msg': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure(level=None, fmt=None):
+    """Install the handler on the root logger. Safe to call more than once."""
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'text')
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if getattr(handler, '_app_logging', False):
+            root.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler._app_logging = True
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(logging.getLogger().level, logging.WARNING))
+
+
+def new_request_id(candidate=None):
+    """Use a caller-supplied ID (e.g. an X-Request-ID header) if it is sane, else generate one."""
+    if candidate and REQUEST_ID_PATTERN.match(candidate):
+        return candidate
+    return uuid.uuid4().hex
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def current_timings():
+    """The {stage: milliseconds} timings collected so far for the current request."""
+    return dict(_timings.get() or {})
+
+
+def begin_request(request_id):
+    """Start tagging log lines with request_id and collecting stage timings. Returns a token for end_request."""
+    return _request_id.set(request_id), _timings.set({})
+
+
+def end_request(token):
+    """Stop the request started by begin_request and return its {stage: milliseconds} timings."""
+    id_token, timings_token = token
+    timings = _timings.get()
+    _timings.reset(timings_token)
+    _request_id.reset(id_token)
+    return timings or {}
+
+
+@contextmanager
+def request_context(request_id):
+    token = begin_request(request_id)
+    timings = _timings.get()
+    try:
+        yield timings
+    finally:
+        end_request(token)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block and add it to the current request's timings (summed if repeated)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = round((time.perf_counter() - start) * 1000, 2)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0) + elapsed, 2)
+        logger.debug("stage finished", extra={'stage': name, 'duration_ms': elapsed})
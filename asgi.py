@@ -0,0 +1,262 @@
+"""ASGI entry point: serve the Flask app from an event loop so slow clients don't pin workers.
+
+With gunicorn's sync workers a customer trickling a CSV into /process, or
+slowly pulling a report from /download, holds a whole worker process for the
+length of the transfer. Here all network I/O happens on the event loop and
+the Flask app only runs once there is something for it to do:
+
+- The request body is received in full before the app sees it, in memory up
+  to app.IN_MEMORY_UPLOAD_SIZE and spooled to a temporary file beyond that.
+  Bodies larger than any route accepts are refused without reading them.
+- The app then runs on a bounded thread pool (ASGI_THREADS, default 4): at most
+  that many requests are parsed or rendered at once per process, however many
+  clients are connected. Word reports still go through the job queue's
+  process pool; PDF, JSON and columnar output are rendered on these threads
+  (charts keep per-thread figures, see charts.py).
+- Response bodies are read a chunk at a time on the loop's default executor
+  and each chunk is awaited out to the client, so a slow download holds a file
+  handle, not a thread.
+
+Hundreds of slow clients then need only a handful of processes. Run it under
+gunicorn with the worker class from the uvicorn-worker package, which keeps
+gunicorn.conf.py's preload and warm-up hooks:
+
+    gunicorn --config gunicorn.conf.py --worker-class uvicorn_worker.UvicornWorker asgi:application
+
+or standalone with ``uvicorn asgi:application --workers 4``. The sync
+``gunicorn app:app`` deployment is unchanged.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+
+logger = logging.getLogger(__name__)
+
+THREADS = int(os.environ.get('ASGI_THREADS', 4))
+CHUNK_SIZE = 64 * 1024
+# The largest body any route accepts; each route still applies its own limit
+MAX_BODY_SIZE = app.app.config['MAX_CONTENT_LENGTH']
+
+
+class FileWrapper:
+    """wsgi.file_wrapper that reads in CHUNK_SIZE blocks: one executor hop per 64 KiB rather than per 8 KiB."""
+
+    def __init__(self, file, block_size=CHUNK_SIZE):
+        self.file = file
+        self.block_size = max(block_size, CHUNK_SIZE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.file.read(self.block_size)
+        if not data:
+            raise StopIteration
+        return data
+
+    def close(self):
+        if hasattr(self.file, 'close'):
+            self.file.close()
+
+
+class Application:
+    """ASGI application wrapping a WSGI app, with a bounded pool for running it."""
+
+    def __init__(self, wsgi_app, threads=THREADS, max_body_size=MAX_BODY_SIZE):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_body_size = max_body_size
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so a preloaded app forks its workers before any thread exists
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='asgi-app')
+            return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                    self._executor = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        headers = scope['headers']
+        length = _header(headers, b'content-length')
+        if length is not None and length.isdigit() and int(length) > self.max_body_size:
+            await _send_too_large(send, self.max_body_size)
+            return
+        body, size = await self._receive_body(receive)
+        if body is None:
+            if size is not None:
+                await _send_too_large(send, self.max_body_size)
+            return  # client disconnected mid-upload
+
+        loop = asyncio.get_running_loop()
+        try:
+            status, response_headers, chunks, first = await loop.run_in_executor(
+                self._get_executor(), self._call_wsgi, _environ(scope, body, size))
+        finally:
+            body.close()
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+            chunk = first
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                # Short file reads, so the shared default executor rather than the bounded app pool
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(chunks, 'close'):
+                await loop.run_in_executor(None, chunks.close)
+
+    async def _receive_body(self, receive):
+        """Read the whole request body: (file, size), (None, None) on disconnect, (None, size) when too large."""
+        body = tempfile.SpooledTemporaryFile(max_size=app.IN_MEMORY_UPLOAD_SIZE)
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None, None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_size:
+                body.close()
+                return None, size
+            if chunk:
+                body.write(chunk)
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body, size
+
+    def _call_wsgi(self, environ):
+        """Run the WSGI app in a pool thread: (status, headers, body iterator, first chunk or None)."""
+        started = []
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [status, response_headers]
+            return _no_write
+
+        result = self.wsgi_app(environ, start_response)
+        chunks = iter(result)
+        try:
+            first = next(chunks, None)
+        except BaseException:
+            if hasattr(result, 'close'):
+                result.close()
+            raise
+        if hasattr(result, 'close') and not hasattr(chunks, 'close'):
+            chunks = _Closing(chunks, result.close)
+        status, response_headers = started
+        return (int(status.split(' ', 1)[0]),
+                [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers],
+                chunks, first)
+
+
+class _Closing:
+    """An iterator that also closes the WSGI result it came from."""
+
+    def __init__(self, iterator, close):
+        self._iterator = iterator
+        self.close = close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+
+def _no_write(data):
+    raise NotImplementedError("The WSGI write() callable is not supported; return the body instead")
+
+
+def _header(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def _send_too_large(send, limit):
+    logger.warning("Rejecting request body over %d bytes", limit)
+    body = json.dumps({
+        'success': False, 'message': f"Upload too large. Maximum size is {limit // (1024 * 1024)}MB.",
+    }).encode('utf-8')
+    # 400, as the Flask routes answer an oversized upload
+    await send({'type': 'http.response.start', 'status': 400, 'headers': [
+        (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('latin-1')),
+        (b'connection', b'close'),
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _environ(scope, body, size):
+    """The WSGI environ for an ASGI HTTP scope whose body has been received into a file."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        # WSGI paths are the raw bytes as latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': FileWrapper,
+    }
+    if size or scope['method'] in ('POST', 'PUT', 'PATCH'):
+        # The body is complete, so its length is known even for a chunked upload
+        environ['CONTENT_LENGTH'] = str(size)
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+application = Application(app.app)
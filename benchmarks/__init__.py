@@ -0,0 +1,64 @@
+"""Benchmarks for the report pipeline. Every module prints one JSON object per result line.
+
+Each line holds the measured fields, 'benchmark' (which benchmark produced it)
+and 'run' (see run_info), written by emit.
+
+    python -m benchmarks.parser_bench     # yds_parser throughput and memory by export size
+    python -m benchmarks.pipeline_bench   # per-stage timings of a single report
+    python -m benchmarks.load_test        # /process throughput and latency under concurrency
+    python -m benchmarks.startup_bench    # time-to-first-report of a fresh process
+    python -m benchmarks.chart_bench      # chart render time against series length
+    python -m benchmarks.slow_clients     # many slow uploads/downloads through asgi.py
+"""
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+
+def run_info():
+    """Context recorded with every result line so runs can be compared over time."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': round(time.time()),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def emit(result, info):
+    """Print one result line: result must name its 'benchmark'; info is this run's run_info()."""
+    print(json.dumps(dict(result, run=info)), flush=True)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of values (0 < p <= 100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def isolate_state():
+    """Point the app's engine history and metrics at a temporary directory for this run.
+
+    Call before importing app (child processes such as a benchmark's gunicorn
+    inherit it too), so benchmark exports aren't recorded in the real history
+    database or counted in the real /metrics. The directory is removed at exit.
+    """
+    directory = tempfile.mkdtemp(prefix='yds-bench-')
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    os.environ['HISTORY_DB'] = os.path.join(directory, 'history', 'engines.sqlite3')
+    os.environ['METRICS_FOLDER'] = os.path.join(directory, 'metrics')
+    return directory
@@ -0,0 +1,87 @@
+"""Chart render time against series length, to check decimation keeps it flat.
+
+For each chart type, backend and length a synthetic series is rendered through
+the public charts.render_* functions (decimation included) and the median time
+is printed as JSON. With --baseline the same series is also handed straight to
+the backend without decimation, for lengths up to --baseline-max; past that the
+undecimated render (a text label per point) takes minutes.
+
+    python -m benchmarks.chart_bench --points 100 10000 1000000 --baseline
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy as np
+
+import charts
+from benchmarks import emit, run_info
+
+
+def series(points):
+    """Engine hours at each record number, and an RPM trace with a spike, of the given length."""
+    rng = np.random.default_rng(points)
+    records = np.arange(1, points + 1, dtype=np.float64)
+    hours = np.round(np.cumsum(rng.uniform(80, 160, points)), 1)
+    times = np.linspace(-points, 0, points)
+    rpm = 700 + 4000 * np.abs(np.sin(times / 300)) + rng.normal(0, 50, points)
+    rpm[points // 2] = 6500
+    return records, hours, times, rpm
+
+
+def render(chart, data, backend, decimated):
+    records, hours, times, rpm = data
+    output = io.BytesIO()
+    if chart == 'line':
+        if decimated:
+            charts.render_line_chart(records, hours, output, backend)
+        else:
+            charts._BACKENDS[backend][1](records.tolist(), hours.tolist(), output)
+    else:
+        if decimated:
+            charts.render_series_chart(times, rpm, rpm, output, "Time (Min)", "Engine speed (r/min)", backend)
+        else:
+            times, rpm = times.tolist(), rpm.tolist()
+            charts._BACKENDS[backend][2](times, rpm, rpm, "Time (Min)", "Engine speed (r/min)", output)
+
+
+def bench(chart, points, backend, decimated, repeat):
+    data = series(points)
+    render(chart, data, backend, decimated)  # warm the backend and this thread's templates
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render(chart, data, backend, decimated)
+        timings.append(time.perf_counter() - start)
+    return {
+        'benchmark': 'chart',
+        'chart': chart,
+        'backend': backend,
+        'points': points,
+        'decimated': decimated,
+        'repeat': repeat,
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, nargs='+', default=[100, 1000, 10000, 100000, 1000000])
+    parser.add_argument('--charts', nargs='+', choices=['line', 'series'], default=['line', 'series'])
+    parser.add_argument('--backends', nargs='+', choices=sorted(charts._BACKENDS), default=sorted(charts._BACKENDS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', action='store_true', help='also time undecimated renders')
+    parser.add_argument('--baseline-max', type=int, default=1000)
+    args = parser.parse_args()
+    info = run_info()
+    for chart in args.charts:
+        for backend in args.backends:
+            for points in args.points:
+                emit(bench(chart, points, backend, True, args.repeat), info)
+                if args.baseline and points <= args.baseline_max:
+                    emit(bench(chart, points, backend, False, args.repeat), info)
+
+
+if __name__ == '__main__':
+    main()
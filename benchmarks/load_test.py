@@ -0,0 +1,199 @@
+"""Load-test /process at increasing concurrency.
+
+By default requests go through Flask's test client in this process, one client
+per thread. With --gunicorn N a local gunicorn with N workers is started for the
+run, and with --url an already running server is targeted instead. Each
+request uploads a synthetic export whose comment is unique, so the report cache
+never answers (pass --allow-cache to measure cache hits instead; queued mode
+only, since inline raw-body delivery never reads the cache).
+
+'inline' mode posts the CSV as the raw body of /process?delivery=inline and
+waits for the report; 'queued' mode uploads it as a form file and polls the
+job until it is done. One JSON line is printed per concurrency level.
+
+    python -m benchmarks.load_test --concurrency 1 2 4 --requests 20
+    python -m benchmarks.load_test --gunicorn 2 --mode queued
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import emit, isolate_state, percentile, run_info
+from benchmarks.synthetic import SCENARIOS, synthetic_export
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _TestClientTarget:
+    def __init__(self):
+        import app
+        self.app = app.app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def post_inline(self, body):
+        response = self._client().post('/process?delivery=inline', data=body, content_type='text/csv')
+        return response.status_code
+
+    def post_queued(self, body):
+        import io
+        response = self._client().post('/process', data={'file': (io.BytesIO(body), 'load.csv')},
+                                       content_type='multipart/form-data')
+        return response.status_code, response.get_json()
+
+    def get_json(self, path):
+        response = self._client().get(path)
+        return response.status_code, response.get_json()
+
+
+class _HttpTarget:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def _request(self, path, data=None, content_type=None):
+        request = urllib.request.Request(self.url + path, data=data)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def post_inline(self, body):
+        return self._request('/process?delivery=inline', body, 'text/csv')[0]
+
+    def post_queued(self, body):
+        boundary = uuid.uuid4().hex
+        payload = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="load.csv"\r\n'
+                   f'Content-Type: text/csv\r\n\r\n').encode('utf-8') + body + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        status, data = self._request('/process', payload, f'multipart/form-data; boundary={boundary}')
+        return status, json.loads(data or b'null')
+
+    def get_json(self, path):
+        status, data = self._request(path)
+        return status, json.loads(data or b'null')
+
+
+def _one_request(target, mode, body):
+    start = time.perf_counter()
+    if mode == 'inline':
+        ok = target.post_inline(body) == 200
+    else:
+        status, result = target.post_queued(body)
+        ok = status in (200, 202)
+        while ok and result.get('status_url'):
+            time.sleep(0.05)
+            status, job = target.get_json(result['status_url'])
+            if job.get('status') in ('done', 'failed'):
+                ok = job['status'] == 'done'
+                break
+    return ok, (time.perf_counter() - start) * 1000
+
+
+def run_level(target, mode, concurrency, bodies):
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for ok, elapsed in pool.map(lambda body: _one_request(target, mode, body), bodies):
+            latencies.append(elapsed)
+            errors += not ok
+    wall = time.perf_counter() - start
+    return {
+        'concurrency': concurrency,
+        'requests': len(bodies),
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(bodies) / wall, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 1),
+            'p95': round(percentile(latencies, 95), 1),
+            'p99': round(percentile(latencies, 99), 1),
+            'max': round(max(latencies), 1),
+        },
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_gunicorn(workers):
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url + '/', timeout=1).close()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--requests', type=int, default=20, help='requests per concurrency level')
+    parser.add_argument('--mode', choices=['inline', 'queued'], default='inline')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='full')
+    parser.add_argument('--allow-cache', action='store_true', help='send identical exports so the report cache can answer')
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument('--url', help='base URL of a running server')
+    target_group.add_argument('--gunicorn', type=int, metavar='WORKERS', help='start a local gunicorn with this many workers')
+    args = parser.parse_args()
+    if args.allow_cache and args.mode == 'inline':
+        parser.error("--allow-cache needs --mode queued: inline raw-body delivery never reads the report cache")
+
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if not args.url:
+        isolate_state()
+    process = None
+    if args.gunicorn:
+        process, url = _start_gunicorn(args.gunicorn)
+        target, target_name = _HttpTarget(url), f'gunicorn:{args.gunicorn}'
+    elif args.url:
+        target, target_name = _HttpTarget(args.url), args.url
+    else:
+        target, target_name = _TestClientTarget(), 'test_client'
+
+    try:
+        info = run_info()
+        run_id = uuid.uuid4().hex[:8]
+        # Warm up imports, chart templates and fonts before measuring
+        _one_request(target, args.mode, synthetic_export(**SCENARIOS[args.scenario], tag=f'warmup-{run_id}').encode('utf-8'))
+        for concurrency in args.concurrency:
+            bodies = [
+                synthetic_export(**SCENARIOS[args.scenario],
+                                 tag=None if args.allow_cache else f'load-{run_id}-{concurrency}-{i}').encode('utf-8')
+                for i in range(args.requests)
+            ]
+            result = run_level(target, args.mode, concurrency, bodies)
+            emit(dict(result, benchmark='load', target=target_name, mode=args.mode, scenario=args.scenario), info)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark yds_parser on synthetic YDS exports of increasing size.
+
+The sample export is padded with extra "7. Data comparison graph" rows, which
+is what makes real data-log exports large. For each size the parse time,
+throughput and peak Python memory (tracemalloc) are printed as JSON. Logs past
+yds_parser.DATA_LOG_CHUNK_ROWS are spilled to a memory-mapped temporary file, so
+peak memory should stay flat as the size grows.
+
+    python -m benchmarks.parser_bench --sizes 1 4 16
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import yds_parser
+from benchmarks import emit, run_info
+from benchmarks.synthetic import synthetic_export
+
+
+def bench(size_mb, repeat):
+    text = synthetic_export(int(size_mb * 1024 * 1024))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        report = yds_parser.parse(io.StringIO(text, newline=''))
+        timings.append(time.perf_counter() - start)
+
+    # Build the stream first so its own buffer is not counted against the parser
+    stream = io.StringIO(text, newline='')
+    tracemalloc.start()
+    yds_parser.parse(stream)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        'benchmark': 'parser',
+        'size_mb': round(len(text) / (1024 * 1024), 2),
+        'data_rows': sum(len(log) for log in report.data_logs),
+        'best_s': round(best, 4),
+        'mb_per_s': round(len(text) / (1024 * 1024) / best, 1),
+        'peak_mem_mb': round(peak / (1024 * 1024), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.1, 1, 4, 16], help='export sizes in MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    info = run_info()
+    for size in args.sizes:
+        emit(bench(size, args.repeat), info)
+
+
+if __name__ == '__main__':
+    main()
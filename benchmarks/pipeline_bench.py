@@ -0,0 +1,87 @@
+"""Time each stage of report generation on synthetic exports.
+
+Every scenario in benchmarks.synthetic.SCENARIOS is run through the same code
+path as /process (parse, bar chart, line chart, docx assembly, doc.save) with
+the stage timings collected by app_logging. One JSON line is printed per
+scenario with the median and p95 of each stage in milliseconds, the
+resulting reports per second for a single worker and the size of the report.
+--compact on|off overrides COMPACT_REPORTS, to compare report sizes and save
+times with and without the compact .docx packaging.
+
+    python -m benchmarks.pipeline_bench --repeat 10 --backend pillow
+    python -m benchmarks.pipeline_bench --compact off
+"""
+import argparse
+import io
+import os
+import statistics
+import time
+
+from benchmarks import emit, isolate_state, percentile, run_info
+from benchmarks.synthetic import SCENARIOS, synthetic_export
+
+
+def _stage_summary(samples):
+    return {
+        'median_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+    }
+
+
+def bench(scenario, repeat, output_format='docx'):
+    import app
+    import app_logging
+
+    text = synthetic_export(**SCENARIOS[scenario])
+    _, report = app.render_report_to_buffer(io.StringIO(text, newline=''), output_format)  # warm-up: imports, templates, fonts
+
+    stages = {}
+    totals = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with app_logging.request_context('bench') as timings:
+            app.render_report_to_buffer(io.StringIO(text, newline=''), output_format)
+        totals.append((time.perf_counter() - start) * 1000)
+        # docx_build includes the charts; report document assembly on its own as well
+        if 'docx_build' in timings:
+            timings['docx_assembly'] = (timings['docx_build'] - timings.get('chart_bar', 0) - timings.get('chart_line', 0)
+                                        - timings.get('chart_data_log', 0))
+        for name, elapsed in timings.items():
+            stages.setdefault(name, []).append(elapsed)
+
+    return {
+        'benchmark': 'pipeline',
+        'scenario': scenario,
+        'format': output_format,
+        'chart_backend': app.app.config['CHART_BACKEND'],
+        'compact': app.app.config['COMPACT_REPORTS'],
+        'input_kb': round(len(text.encode('utf-8')) / 1024, 1),
+        'repeat': repeat,
+        'total': _stage_summary(totals),
+        'reports_per_s': round(1000 / statistics.median(totals), 2),
+        'output_bytes': report.getbuffer().nbytes,
+        'stages': {name: _stage_summary(samples) for name, samples in stages.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--format', default='docx', choices=['docx', 'json', 'columnar', 'pdf'])
+    parser.add_argument('--backend', help='chart backend (defaults to the CHART_BACKEND setting)')
+    parser.add_argument('--compact', choices=['on', 'off'], help='compact reports (defaults to the COMPACT_REPORTS setting)')
+    args = parser.parse_args()
+    if args.backend:
+        os.environ['CHART_BACKEND'] = args.backend
+    if args.compact:
+        os.environ['COMPACT_REPORTS'] = '1' if args.compact == 'on' else '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    isolate_state()
+    info = run_info()
+    for scenario in args.scenarios:
+        emit(bench(scenario, args.repeat, args.format), info)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Serve many slow clients at once through the ASGI entry point (asgi.py).
+
+Drives asgi.application in this process, without a server: each simulated
+client trickles a synthetic export into /process?format=json, or downloads a
+finished report, at --chunk-size bytes per --chunk-delay. The JSON line reports the wall time, request latencies and the most
+threads that were ever busy running the Flask app. With slow clients, busy
+threads should stay far below the number of clients; under sync workers each
+client would hold a worker process for the whole transfer.
+
+    python -m benchmarks.slow_clients --clients 200 --chunk-delay 0.02
+    python -m benchmarks.slow_clients --mode download --clients 300
+"""
+import argparse
+import asyncio
+import io
+import json
+import statistics
+import threading
+import time
+
+from benchmarks import emit, isolate_state, percentile, run_info
+from benchmarks.synthetic import SCENARIOS, synthetic_export
+
+
+class _BusyCounter:
+    """Wraps a WSGI app to record how many calls run at the same time."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.busy = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.busy += 1
+            self.peak = max(self.peak, self.busy)
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            with self._lock:
+                self.busy -= 1
+
+
+async def _request(application, method, path, body=b'', content_type=None, chunk_size=4096, chunk_delay=0.0):
+    """One request against the ASGI app; the body is sent and the response read chunk_size/chunk_delay paced."""
+    path, _, query = path.partition('?')
+    headers = [(b'content-length', str(len(body)).encode())]
+    if content_type:
+        headers.append((b'content-type', content_type.encode()))
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': headers, 'http_version': '1.1', 'scheme': 'http',
+             'server': ('bench', 80), 'client': ('127.0.0.1', 0)}
+    pieces = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    sent = iter(range(len(pieces)))
+    response = {'status': None, 'body': bytearray()}
+
+    async def receive():
+        i = next(sent, None)
+        if i is None:
+            await asyncio.Event().wait()  # no more body: wait like a connected client
+        if i:
+            await asyncio.sleep(chunk_delay)
+        return {'type': 'http.request', 'body': pieces[i], 'more_body': i < len(pieces) - 1}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            data = message.get('body', b'')
+            response['body'] += data
+            # The client reads chunk_size bytes per chunk_delay, whatever size the server sends
+            await asyncio.sleep(chunk_delay * len(data) / chunk_size)
+
+    await application(scope, receive, send)
+    return response['status'], bytes(response['body'])
+
+
+async def _download_url(application):
+    """Queue one Word report and wait for it: the download every client then fetches."""
+    body, boundary = _multipart(synthetic_export(**SCENARIOS['full']).encode('utf-8'))
+    status, payload = await _request(application, 'POST', '/process', body,
+                                     f'multipart/form-data; boundary={boundary}', chunk_size=len(body))
+    job = json.loads(payload)
+    if 'download_url' in job:  # report cache hit
+        return job['download_url']
+    while True:
+        _, payload = await _request(application, 'GET', job['status_url'])
+        state = json.loads(payload)
+        if state['status'] == 'done':
+            return state['download_url']
+        if state['status'] == 'failed':
+            raise RuntimeError(f"Report job failed: {state}")
+        await asyncio.sleep(0.1)
+
+
+def _multipart(data):
+    boundary = 'slowclientsbench'
+    body = io.BytesIO()
+    body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.csv"\r\n'
+               'Content-Type: text/csv\r\n\r\n'.encode())
+    body.write(data)
+    body.write(f'\r\n--{boundary}--\r\n'.encode())
+    return body.getvalue(), boundary
+
+
+async def _run(mode, clients, chunk_size, chunk_delay, threads):
+    import app
+    import asgi
+
+    counter = _BusyCounter(app.app)
+    application = asgi.Application(counter, threads=threads)
+    if mode == 'upload':
+        export = synthetic_export(**SCENARIOS['full']).encode('utf-8')
+        make = lambda: _request(application, 'POST', '/process?format=json', export, 'text/csv',
+                                chunk_size, chunk_delay)
+    else:
+        url = await _download_url(application)
+        make = lambda: _request(application, 'GET', url, chunk_size=chunk_size, chunk_delay=chunk_delay)
+    counter.peak = 0
+
+    latencies = []
+
+    async def client():
+        start = time.perf_counter()
+        status, _ = await make()
+        latencies.append((time.perf_counter() - start) * 1000)
+        return status
+
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(client() for _ in range(clients)))
+    wall = time.perf_counter() - start
+    return {
+        'benchmark': 'slow_clients',
+        'mode': mode,
+        'clients': clients,
+        'chunk_size': chunk_size,
+        'chunk_delay_ms': chunk_delay * 1000,
+        'app_threads': threads,
+        'ok': sum(1 for status in statuses if status == 200),
+        'wall_s': round(wall, 2),
+        'latency_median_ms': round(statistics.median(latencies), 1),
+        'latency_p95_ms': round(percentile(latencies, 95), 1),
+        'peak_busy_app_threads': counter.peak,
+        'process_threads': threading.active_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', choices=['upload', 'download'], default='upload')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=4096, help='bytes sent or received per step')
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help='seconds a client pauses between chunks')
+    parser.add_argument('--threads', type=int, default=4, help='ASGI_THREADS for the run')
+    args = parser.parse_args()
+    isolate_state()
+
+    result = asyncio.run(_run(args.mode, args.clients, args.chunk_size, args.chunk_delay, args.threads))
+    emit(result, run_info())
+
+
+if __name__ == '__main__':
+    main()
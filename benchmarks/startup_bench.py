@@ -0,0 +1,82 @@
+"""Measure time-to-first-report of a fresh process.
+
+Each mode runs in a new Python process that imports the app and posts the
+sample export to /process?delivery=inline through the test client:
+
+    cold        empty matplotlib config dir, so the font cache is built on first use
+    font_cache  font cache pre-built (as `python -m charts` does at deploy time)
+    warmed      font cache pre-built and app.warm_up() run first, as gunicorn.conf.py does
+
+One JSON line per mode reports the import time, the warm-up time (warmed only),
+the first and second report times and the total from process start to first
+report.
+
+    python -m benchmarks.startup_bench --repeat 3
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import emit, run_info
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+warm_up_s = app.warm_up() if sys.argv[1] == 'warmed' else 0.0
+client = app.app.test_client()
+data = open('Static/sample.csv', 'rb').read()
+timings = []
+for _ in range(2):
+    t = time.perf_counter()
+    response = client.post('/process?delivery=inline', data=data, content_type='text/csv')
+    assert response.status_code == 200, response.status_code
+    timings.append(time.perf_counter() - t)
+print(json.dumps({'import_s': imported - start, 'warm_up_s': warm_up_s, 'first_report_s': timings[0],
+                  'second_report_s': timings[1], 'time_to_first_report_s': imported - start + warm_up_s + timings[0]}))
+'''
+
+
+def run_child(mode, config_dir):
+    env = dict(os.environ, MPLCONFIGDIR=config_dir, REPORT_CACHE_ENABLED='0', METRICS_ENABLED='0', HISTORY_ENABLED='0', LOG_LEVEL='WARNING')
+    if mode != 'cold':
+        subprocess.run([sys.executable, '-m', 'charts'], cwd=ROOT, env=env, check=True, capture_output=True)
+    output = subprocess.run([sys.executable, '-c', CHILD, mode], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench(mode, repeat):
+    samples = []
+    for _ in range(repeat):
+        config_dir = tempfile.mkdtemp(prefix='mplconfig-')
+        try:
+            samples.append(run_child(mode, config_dir))
+        finally:
+            shutil.rmtree(config_dir, ignore_errors=True)
+    result = {'benchmark': 'startup', 'mode': mode, 'repeat': repeat}
+    for key in samples[0]:
+        result[key] = round(statistics.median(sample[key] for sample in samples), 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=['cold', 'font_cache', 'warmed'], default=['cold', 'font_cache', 'warmed'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    info = run_info()
+    for mode in args.modes:
+        emit(bench(mode, args.repeat), info)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Synthetic YDS exports built from Static/sample.csv.
+
+synthetic_export() keeps the sample's header and lets the caller choose which
+numbered sections to include, how many oil exchange records section 2 holds and
+how large the section 7 data log grows, so benchmarks can cover everything from
+a header-only export to a multi-MB data-log dump.
+
+    text = synthetic_export(4 * 1024 * 1024, sections={1, 2, 3}, oil_exchanges=40)
+"""
+import os
+import re
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Static', 'sample.csv')
+ALL_SECTIONS = frozenset(range(1, 8))
+DATA_ROW = '"{t}","","Min","Min","{rpm}","14.4","0.64","56","132.8","35.6","10.5","0"\n'
+OIL_ROW = '"{n}","","{hours:.1f}","","","","",""\n'
+SECTION_START = re.compile(r'^"(\d)\. ', re.MULTILINE)
+COMMENT = '"1700hr@1717hr"'
+
+_sample = None
+
+
+def _sample_parts():
+    """The sample split into (header, {section number: section text})."""
+    global _sample
+    if _sample is None:
+        with open(SAMPLE_PATH, encoding='utf-8') as f:
+            text = f.read()
+        starts = [(m.start(), int(m.group(1))) for m in SECTION_START.finditer(text)]
+        sections = {}
+        for i, (start, number) in enumerate(starts):
+            end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+            sections[number] = text[start:end]
+        _sample = (text[:starts[0][0]], sections)
+    return _sample
+
+
+def _oil_section(section, count):
+    title, _, _ = section.partition('"1","",')
+    rows = [OIL_ROW.format(n=n + 1, hours=150.0 + 120.0 * n) for n in range(count)]
+    return title + ''.join(rows) + '\n'
+
+
+def _pad_data_log(section, target_bytes):
+    head, marker, tail = section.partition('"Time","Time","Unit","Unit"')
+    header_end = tail.index('\n') + 1
+    parts = [head, marker, tail[:header_end]]
+    size = sum(len(p) for p in parts) + len(tail) - header_end
+    t = -1_000_000
+    while size < target_bytes:
+        row = DATA_ROW.format(t=t, rpm=700 + (t % 5000))
+        parts.append(row)
+        size += len(row)
+        t += 1
+    parts.append(tail[header_end:])
+    return ''.join(parts)
+
+
+def synthetic_export(target_bytes=0, sections=ALL_SECTIONS, oil_exchanges=None, tag=None):
+    """Return export text containing the given sections.
+
+    target_bytes pads the section 7 data log until the whole export is roughly
+    that size. oil_exchanges replaces the section 2 records with that many
+    evenly spaced ones. tag replaces the header comment, which makes otherwise
+    identical exports hash differently (e.g. to defeat the report cache).
+    """
+    header, sample_sections = _sample_parts()
+    if tag is not None:
+        header = header.replace(COMMENT, f'"{tag}"')
+    parts = [header]
+    for number in sorted(sections):
+        section = sample_sections[number]
+        if number == 2 and oil_exchanges is not None:
+            section = _oil_section(section, oil_exchanges)
+        parts.append(section)
+    if 7 in sections and target_bytes:
+        base = sum(len(p) for p in parts) - len(parts[-1])
+        parts[-1] = _pad_data_log(parts[-1], target_bytes - base)
+    return ''.join(parts)
+
+
+# Named section mixes for benchmarks: what real exports from different YDS screens contain
+SCENARIOS = {
+    'full': dict(sections=ALL_SECTIONS),
+    'no_data_log': dict(sections=frozenset(range(1, 7))),
+    'summary_only': dict(sections=frozenset({1, 2})),
+    'many_oil_changes': dict(sections=ALL_SECTIONS, oil_exchanges=60),
+    'large_data_log': dict(sections=ALL_SECTIONS, target_bytes=4 * 1024 * 1024),
+}
@@ -0,0 +1,506 @@
+"""Chart rendering for the diagnostics report.
+
+The matplotlib backend uses the object-oriented Figure/Agg canvas API instead of
+the global pyplot state machine. Each thread keeps one pre-styled figure per
+chart type (size, spines, grid, fonts, axis labels) and every render only swaps
+in the new data, so concurrent renders from a threaded worker never share state.
+
+The 'pillow' backend draws the same fixed chart types directly onto a PNG with
+Pillow and skips matplotlib completely; it is much cheaper but simpler looking.
+
+Every series is decimated (see decimate.py) before it reaches a backend, so
+render cost depends on the chart's size, not on the length of the data: line
+charts keep at most LINE_MAX_POINTS points chosen by LTTB, and series charts
+(the section 7 data log) at most SERIES_MAX_BUCKETS min/max buckets, each drawn
+as a vertical stroke from its low to its high. Line charts label and tick every
+point only while there are few of them, then switch to a spread-out selection.
+
+draw_bar_chart, draw_line_chart and draw_series_chart draw the same styled,
+decimated charts onto a caller's matplotlib Axes instead of a PNG, which is how
+the PDF report (pdf_report.py) gets vector charts.
+
+matplotlib is only imported on the first matplotlib render, pinned to the
+non-interactive Agg backend, with its config and font cache kept in
+MPLCONFIGDIR (by default .matplotlib next to this file) so the cache built at
+deploy time by `python -m charts` is reused instead of rebuilt on every start.
+"""
+import io
+import math
+import os
+import threading
+
+BAR_COLOR = '#4C78A8'
+LINE_COLOR = '#FF6F61'
+SERIES_COLOR = '#2A5783'
+DPI = 100
+# Longest series handed to a backend; about one point or bucket per horizontal pixel or less
+LINE_MAX_POINTS = 100
+SERIES_MAX_BUCKETS = 600
+# Line charts label every point up to this many, then an even spread plus the last and the highest
+LABEL_MAX_POINTS = 15
+
+_local = threading.local()
+
+DEFAULT_MPLCONFIGDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.matplotlib')
+
+
+def load_matplotlib():
+    """Import matplotlib on the Agg backend, with its font cache under MPLCONFIGDIR.
+
+    Call before drawing onto Figures built outside this module (see pdf_report).
+    """
+    os.environ.setdefault('MPLCONFIGDIR', DEFAULT_MPLCONFIGDIR)
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+# (xlabel, ylabel, label size, tick size, label padding, grid axis) of each chart
+BAR_STYLE = ("Engine Speed Range (r/min)", "Hours", 10, 8, 15, 'y')
+LINE_STYLE = ("Record Number", "Engine Hours", 8, 6, 10, 'both')
+SERIES_STYLE = ("Time", "", 8, 7, 6, 'both')
+
+
+def _style_axes(ax, xlabel, ylabel, label_size, tick_size, labelpad, grid_axis):
+    ax.set_xlabel(xlabel, fontsize=label_size, labelpad=labelpad, fontweight='bold')
+    ax.set_ylabel(ylabel, fontsize=label_size, labelpad=labelpad, fontweight='bold')
+    ax.tick_params(axis='y', labelsize=tick_size)
+    ax.grid(True, axis=grid_axis, linestyle='--', alpha=0.7, color='gray')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['left'].set_color('gray')
+    ax.spines['bottom'].set_color('gray')
+
+
+class _ChartTemplate:
+    """A styled figure and axes that can be re-rendered with new data."""
+
+    def __init__(self, figsize, style):
+        load_matplotlib()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=figsize, facecolor='white')
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self._artists = []
+        _style_axes(self.ax, *style)
+
+    def clear_data(self):
+        for artist in self._artists:
+            artist.remove()
+        self._artists = []
+        self.ax.containers.clear()
+
+    def save(self, output, colors=None):
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.figure.tight_layout()
+        if not colors:
+            self.figure.savefig(output, format='png', bbox_inches='tight', dpi=DPI)
+            return
+        from PIL import Image
+
+        # Only decoded again straight away, so skip the (costly) compression of the intermediate PNG
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format='png', bbox_inches='tight', dpi=DPI, pil_kwargs={'compress_level': 0})
+        buffer.seek(0)
+        with Image.open(buffer) as image:
+            _save_png(image, output, colors)
+
+
+def _save_png(image, output, colors=None):
+    """Save a Pillow image as PNG, as an undithered palette of at most colors colours when colors is set.
+
+    The charts are a handful of flat colours plus anti-aliasing, so the palette
+    image looks the same at a fraction of the size.
+    """
+    from PIL import Image
+
+    if not colors:
+        image.save(output, format='PNG', optimize=True)
+        return
+    image = image.convert('RGB').quantize(colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    # Palette data is small already; optimize (zlib level 9) would cost more than the rest of the save
+    image.save(output, format='PNG')
+
+
+def _bar_template():
+    template = getattr(_local, 'bar', None)
+    if template is None:
+        template = _local.bar = _ChartTemplate((5.5, 4.0), BAR_STYLE)
+    return template
+
+
+def _line_template():
+    template = getattr(_local, 'line', None)
+    if template is None:
+        template = _local.line = _ChartTemplate((3.5, 2.5), LINE_STYLE)
+    return template
+
+
+def _series_template():
+    template = getattr(_local, 'series', None)
+    if template is None:
+        template = _local.series = _ChartTemplate((6.5, 2.2), SERIES_STYLE)
+    return template
+
+
+def _label_indices(ys):
+    """Indices of the line chart points that get a value label."""
+    n = len(ys)
+    if n <= LABEL_MAX_POINTS:
+        return list(range(n))
+    picks = set(range(0, n, math.ceil(n / (LABEL_MAX_POINTS - 2))))
+    picks.add(n - 1)
+    picks.add(max(range(n), key=lambda i: -math.inf if math.isnan(ys[i]) else ys[i]))
+    return sorted(picks)
+
+
+def _envelope(xs, lows, highs):
+    """Points of one polyline through every bucket's low and high."""
+    if lows is highs:
+        return list(xs), list(lows)
+    points_x = []
+    points_y = []
+    for x, low, high in zip(xs, lows, highs):
+        points_x += (x, x)
+        points_y += (low, high)
+    return points_x, points_y
+
+
+def _draw_bars(ax, labels, values):
+    """Draw the bar chart data onto styled axes; returns the artists added."""
+    positions = list(range(len(labels)))
+    bars = ax.bar(positions, values, color=BAR_COLOR, edgecolor='black', linewidth=1.2, alpha=0.9, width=0.5)
+    artists = list(bars)
+    for bar in bars:
+        yval = bar.get_height()
+        artists.append(ax.text(bar.get_x() + bar.get_width() / 2, yval + 0.5, f'{yval}', ha='center', va='bottom', fontsize=8, fontweight='bold'))
+    ax.set_xticks(positions, labels, rotation=45, ha='right', fontsize=BAR_STYLE[3])
+    return artists
+
+
+def _draw_line(ax, xs, ys):
+    """Draw the line chart data onto styled axes; returns the artists added."""
+    from matplotlib.ticker import MaxNLocator
+
+    dense = len(xs) > LABEL_MAX_POINTS
+    artists = ax.plot(xs, ys, marker='o', color=LINE_COLOR, linewidth=2, markersize=3 if dense else 6, markerfacecolor=LINE_COLOR, markeredgecolor='black', markeredgewidth=1)
+    for i in _label_indices(ys):
+        if dense:
+            # A fixed data offset is lost on a tall axis; lift the label clear of the line instead
+            label = ax.annotate(f'{ys[i]}', (xs[i], ys[i]), xytext=(-4, 4), textcoords='offset points', ha='right', va='bottom', fontsize=6, fontweight='bold')
+        else:
+            label = ax.text(xs[i], ys[i] + 50, f'{ys[i]}', ha='center', va='bottom', fontsize=6, fontweight='bold')
+        artists.append(label)
+    if dense:
+        ax.xaxis.set_major_locator(MaxNLocator(nbins=10, integer=True))
+    else:
+        ax.set_xticks(xs)
+    ax.tick_params(axis='x', labelsize=LINE_STYLE[3])
+    return artists
+
+
+def _draw_series(ax, xs, lows, highs, xlabel, ylabel):
+    """Draw a bucketed time series onto styled axes; returns the artists added."""
+    ax.xaxis.label.set_text(xlabel)
+    ax.yaxis.label.set_text(ylabel)
+    points_x, points_y = _envelope(xs, lows, highs)
+    ax.tick_params(axis='x', labelsize=SERIES_STYLE[3])
+    return ax.plot(points_x, points_y, color=SERIES_COLOR, linewidth=1)
+
+
+def _matplotlib_bar_chart(labels, values, output, colors=None):
+    template = _bar_template()
+    template.clear_data()
+    template._artists.extend(_draw_bars(template.ax, labels, values))
+    template.save(output, colors)
+
+
+def _matplotlib_line_chart(xs, ys, output, colors=None):
+    template = _line_template()
+    template.clear_data()
+    template._artists.extend(_draw_line(template.ax, xs, ys))
+    template.save(output, colors)
+
+
+def _matplotlib_series_chart(xs, lows, highs, xlabel, ylabel, output, colors=None):
+    template = _series_template()
+    template.clear_data()
+    template._artists.extend(_draw_series(template.ax, xs, lows, highs, xlabel, ylabel))
+    template.save(output, colors)
+
+
+# Pillow backend
+
+def _font(size, bold=False):
+    from PIL import ImageFont
+
+    cache = getattr(_local, 'fonts', None)
+    if cache is None:
+        cache = _local.fonts = {}
+    key = (size, bold)
+    if key not in cache:
+        try:
+            cache[key] = ImageFont.truetype('DejaVuSans-Bold.ttf' if bold else 'DejaVuSans.ttf', size)
+        except OSError:
+            cache[key] = ImageFont.load_default(size)
+    return cache[key]
+
+
+def _nice_ticks(vmax, count=6):
+    """Round tick positions from 0 up to just past vmax."""
+    if vmax <= 0:
+        return [0, 1]
+    raw = vmax / count
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw)
+    ticks = [0]
+    while ticks[-1] < vmax:
+        ticks.append(ticks[-1] + step)
+    return ticks
+
+
+def _span_ticks(vmin, vmax, count=8):
+    """Round tick positions inside [vmin, vmax]."""
+    if not vmax > vmin:
+        return [vmin]
+    raw = (vmax - vmin) / count
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw)
+    tick = math.ceil(vmin / step) * step
+    ticks = []
+    while tick <= vmax:
+        ticks.append(tick)
+        tick += step
+    return ticks
+
+
+def _format_tick(value):
+    return f'{value:g}'
+
+
+def _dashed_hline(draw, x0, x1, y, fill):
+    for x in range(int(x0), int(x1), 6):
+        draw.line([(x, y), (min(x + 3, x1), y)], fill=fill, width=1)
+
+
+def _dashed_vline(draw, x, y0, y1, fill):
+    for y in range(int(y0), int(y1), 6):
+        draw.line([(x, y), (x, min(y + 3, y1))], fill=fill, width=1)
+
+
+def _draw_axes(image, draw, box, xlabel, ylabel, ticks, label_size, tick_size, scale_y):
+    from PIL import Image, ImageDraw
+
+    left, top, right, bottom = box
+    tick_font = _font(tick_size)
+    label_font = _font(label_size, bold=True)
+    for tick in ticks:
+        y = scale_y(tick)
+        _dashed_hline(draw, left, right, y, '#b3b3b3')
+        text = _format_tick(tick)
+        width = draw.textlength(text, font=tick_font)
+        draw.text((left - 6 - width, y - tick_size // 2 - 1), text, fill='black', font=tick_font)
+    draw.line([(left, top), (left, bottom)], fill='gray', width=1)
+    draw.line([(left, bottom), (right, bottom)], fill='gray', width=1)
+
+    xlabel_width = draw.textlength(xlabel, font=label_font)
+    draw.text(((left + right - xlabel_width) / 2, image.height - label_size - 8), xlabel, fill='black', font=label_font)
+    ylabel_width = int(draw.textlength(ylabel, font=label_font)) + 2
+    ylabel_image = Image.new('RGBA', (ylabel_width, label_size + 4), (255, 255, 255, 0))
+    ImageDraw.Draw(ylabel_image).text((0, 0), ylabel, fill='black', font=label_font)
+    ylabel_image = ylabel_image.rotate(90, expand=True)
+    image.paste(ylabel_image, (6, int((top + bottom - ylabel_image.height) / 2)), ylabel_image)
+
+
+def _pillow_bar_chart(labels, values, output, colors=None):
+    from PIL import Image, ImageDraw
+
+    width, height = 550, 400
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    tick_font = _font(8)
+    value_font = _font(8, bold=True)
+    box = (60, 20, width - 15, height - 110)
+    left, top, right, bottom = box
+    ticks = _nice_ticks(max(values) * 1.05 if values else 1)
+    scale_y = lambda v: bottom - (bottom - top) * v / ticks[-1]
+    _draw_axes(image, draw, box, "Engine Speed Range (r/min)", "Hours", ticks, 10, 8, scale_y)
+
+    slot = (right - left) / max(len(values), 1)
+    for i, (label, value) in enumerate(zip(labels, values)):
+        center = left + slot * (i + 0.5)
+        draw.rectangle([center - slot / 4, scale_y(value), center + slot / 4, bottom], fill=BAR_COLOR, outline='black', width=1)
+        text = f'{value}'
+        draw.text((center - draw.textlength(text, font=value_font) / 2, scale_y(value) - 12), text, fill='black', font=value_font)
+        label_width = int(draw.textlength(label, font=tick_font)) + 2
+        label_image = Image.new('RGBA', (label_width, 12), (255, 255, 255, 0))
+        ImageDraw.Draw(label_image).text((0, 0), label, fill='black', font=tick_font)
+        label_image = label_image.rotate(45, expand=True)
+        image.paste(label_image, (int(center - label_image.width), int(bottom + 4)), label_image)
+    _save_png(image, output, colors)
+
+
+def _pillow_line_chart(xs, ys, output, colors=None):
+    from PIL import Image, ImageDraw
+
+    width, height = 350, 250
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    tick_font = _font(6)
+    value_font = _font(6, bold=True)
+    box = (45, 18, width - 12, height - 40)
+    left, top, right, bottom = box
+    # Missing readings (None or NaN) are left out of the scale and not drawn
+    finite = [y for y in ys if y is not None and math.isfinite(y)]
+    ticks = _nice_ticks(max(finite) * 1.1 if finite else 1)
+    scale_y = lambda v: bottom - (bottom - top) * v / ticks[-1]
+    x_min, x_max = (min(xs), max(xs)) if xs else (0, 1)
+    span = (x_max - x_min) or 1
+    scale_x = lambda v: left + 8 + (right - left - 16) * (v - x_min) / span
+    _draw_axes(image, draw, box, "Record Number", "Engine Hours", ticks, 8, 6, scale_y)
+
+    dense = len(xs) > LABEL_MAX_POINTS
+    for x in _span_ticks(x_min, x_max, 10) if dense else xs:
+        _dashed_vline(draw, scale_x(x), top, bottom, '#b3b3b3')
+        text = _format_tick(x) if dense else f'{x}'
+        draw.text((scale_x(x) - draw.textlength(text, font=tick_font) / 2, bottom + 3), text, fill='black', font=tick_font)
+    points = [(scale_x(x), scale_y(y)) if y is not None and math.isfinite(y) else None for x, y in zip(xs, ys)]
+    drawn = [point for point in points if point is not None]
+    if len(drawn) > 1:
+        draw.line(drawn, fill=LINE_COLOR, width=2)
+    radius = 1.5 if dense else 3
+    for px, py in drawn:
+        draw.ellipse([px - radius, py - radius, px + radius, py + radius], fill=LINE_COLOR, outline='black')
+    for i in _label_indices(ys):
+        if points[i] is None:
+            continue
+        px, py = points[i]
+        text = f'{ys[i]}'
+        draw.text((px - draw.textlength(text, font=value_font) / 2, py - 12), text, fill='black', font=value_font)
+    _save_png(image, output, colors)
+
+
+def _pillow_series_chart(xs, lows, highs, xlabel, ylabel, output, colors=None):
+    from PIL import Image, ImageDraw
+
+    width, height = 650, 220
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    tick_font = _font(7)
+    box = (55, 12, width - 15, height - 42)
+    left, top, right, bottom = box
+    finite = [v for v in list(lows) + list(highs) if not math.isnan(v)]
+    y_min, y_max = (min(finite), max(finite)) if finite else (0, 1)
+    pad = (y_max - y_min) * 0.05 or abs(y_max) * 0.05 or 1
+    # Anchored at 0 like the other charts unless readings go negative (e.g. temperatures)
+    y_min, y_max = min(0, y_min - pad), y_max + pad
+    ticks = _span_ticks(y_min, y_max)
+    scale_y = lambda v: bottom - (bottom - top) * (v - y_min) / (y_max - y_min)
+    x_min, x_max = (min(xs), max(xs)) if len(xs) else (0, 1)
+    span = (x_max - x_min) or 1
+    scale_x = lambda v: left + (right - left) * (v - x_min) / span
+    _draw_axes(image, draw, box, xlabel, ylabel, ticks, 8, 7, scale_y)
+
+    for x in _span_ticks(x_min, x_max):
+        text = _format_tick(x)
+        draw.text((scale_x(x) - draw.textlength(text, font=tick_font) / 2, bottom + 3), text, fill='black', font=tick_font)
+    # NaN (no reading) breaks the line, as it does in matplotlib
+    segment = []
+    for x, y in zip(*_envelope(xs, lows, highs)):
+        if math.isnan(y):
+            if len(segment) > 1:
+                draw.line(segment, fill=SERIES_COLOR, width=1)
+            segment = []
+        else:
+            segment.append((scale_x(x), scale_y(y)))
+    if len(segment) > 1:
+        draw.line(segment, fill=SERIES_COLOR, width=1)
+    _save_png(image, output, colors)
+
+
+_BACKENDS = {
+    'matplotlib': (_matplotlib_bar_chart, _matplotlib_line_chart, _matplotlib_series_chart),
+    'pillow': (_pillow_bar_chart, _pillow_line_chart, _pillow_series_chart),
+}
+
+
+def render_bar_chart(labels, values, output, backend='matplotlib', colors=None):
+    """Render a PNG bar chart of values per label to output (a path or binary file object).
+
+    colors, when given, limits every render_* PNG to a palette of that many colours.
+    """
+    _BACKENDS[backend][0](labels, values, output, colors)
+
+
+def _line_points(xs, ys):
+    if len(ys) > LINE_MAX_POINTS:
+        from decimate import lttb
+        return (values.tolist() for values in lttb(xs, ys, LINE_MAX_POINTS))
+    return list(xs), list(ys)
+
+
+def _series_points(xs, lows, highs):
+    if len(xs) > SERIES_MAX_BUCKETS:
+        from decimate import min_max
+        if lows is highs:
+            xs, lows, highs = min_max(xs, lows, SERIES_MAX_BUCKETS)
+        else:
+            _, lows, _ = min_max(xs, lows, SERIES_MAX_BUCKETS)
+            xs, _, highs = min_max(xs, highs, SERIES_MAX_BUCKETS)
+        return xs.tolist(), lows.tolist(), highs.tolist()
+    if lows is highs:
+        lows = list(lows)
+        return list(xs), lows, lows
+    return list(xs), list(lows), list(highs)
+
+
+def render_line_chart(xs, ys, output, backend='matplotlib', colors=None):
+    """Render a PNG line chart of ys against xs (lists or arrays), annotating the points (all of them when there are few)."""
+    xs, ys = _line_points(xs, ys)
+    _BACKENDS[backend][1](xs, ys, output, colors)
+
+
+def render_series_chart(xs, lows, highs, output, xlabel="Time", ylabel="", backend='matplotlib', colors=None):
+    """Render a PNG chart of a time series as per-bucket lows and highs (NaN gaps break the line).
+
+    Pass the same sequence as lows and highs for a raw series; either way it is
+    reduced to SERIES_MAX_BUCKETS min/max buckets first. Sequences may be lists or arrays.
+    """
+    xs, lows, highs = _series_points(xs, lows, highs)
+    _BACKENDS[backend][2](xs, lows, highs, xlabel, ylabel, output, colors)
+
+
+# Drawing onto a caller's matplotlib Axes, e.g. a region of a PDF page (see pdf_report.py)
+
+def draw_bar_chart(ax, labels, values):
+    """Draw the report's bar chart onto ax, styled as render_bar_chart's."""
+    _style_axes(ax, *BAR_STYLE)
+    _draw_bars(ax, labels, values)
+
+
+def draw_line_chart(ax, xs, ys):
+    """Draw the report's line chart onto ax, decimated and styled as render_line_chart's."""
+    _style_axes(ax, *LINE_STYLE)
+    _draw_line(ax, *_line_points(xs, ys))
+
+
+def draw_series_chart(ax, xs, lows, highs, xlabel="Time", ylabel=""):
+    """Draw a time series chart onto ax, decimated and styled as render_series_chart's."""
+    _style_axes(ax, *SERIES_STYLE)
+    _draw_series(ax, *_series_points(xs, lows, highs), xlabel, ylabel)
+
+
+def warm_up(backend='matplotlib'):
+    """Render one throwaway chart of each type: imports the backend, loads fonts and builds this thread's templates."""
+    render_bar_chart(['0 - 1000 r/min', '1000 - 2000 r/min'], [1.0, 2.0], io.BytesIO(), backend)
+    render_line_chart([1, 2], [100.0, 200.0], io.BytesIO(), backend)
+    render_series_chart([0.0, 1.0], [1.0, 2.0], [1.5, 2.5], io.BytesIO(), backend=backend)
+
+
+if __name__ == '__main__':
+    # Run at build/deploy time to pre-build matplotlib's font cache in MPLCONFIGDIR
+    load_matplotlib()
+    warm_up()  # creating the first figure loads the font manager, which writes the cache
+    print(f"matplotlib font cache ready in {os.environ['MPLCONFIGDIR']}")
@@ -0,0 +1,102 @@
+"""Reduce long time series to what a chart can actually show.
+
+Charts run every series through one of these before drawing, so render cost
+depends on the chart's width in pixels rather than on the length of the data:
+
+min_max() splits a series into equal-count buckets and keeps the lowest and
+highest value of each, so spikes and dropouts survive that plain subsampling
+would drop. It suits dense signals drawn as an envelope (the section 7 logs).
+The input is read in fixed-size chunks, which keeps memory flat for numpy
+memmaps of any length (see yds_parser.DataLog).
+
+lttb() (Largest-Triangle-Three-Buckets) keeps actual points of the series,
+choosing in each bucket the one that forms the largest triangle with its
+neighbours. It suits line charts with markers and value labels.
+
+    xs, lows, highs = min_max(log.times, log.columns[0], 500)
+    xs, ys = lttb(records, hours, 50)
+"""
+import numpy as np
+
+CHUNK_ROWS = 1 << 16
+
+
+def min_max(xs, ys, buckets):
+    """Return (xs, lows, highs) float arrays with at most buckets entries.
+
+    Each bucket is represented by its first x and the minimum and maximum y
+    (NaNs ignored; NaN only if the whole bucket is). Series that already fit
+    are returned as they are, with lows and highs the same array.
+    """
+    n = len(ys)
+    if n <= buckets:
+        ys = np.asarray(ys, dtype=np.float64)
+        return np.asarray(xs, dtype=np.float64), ys, ys
+    size = -(-n // buckets)
+    count = -(-n // size)
+    bucket_xs = np.empty(count)
+    lows = np.empty(count)
+    highs = np.empty(count)
+    step = max(1, CHUNK_ROWS // size) * size
+    for start in range(0, n, step):
+        chunk = np.asarray(ys[start:start + step], dtype=np.float64)
+        pad = -len(chunk) % size
+        if pad:
+            chunk = np.concatenate([chunk, np.full(pad, np.nan)])
+        chunk = chunk.reshape(-1, size)
+        first = start // size
+        rows = slice(first, first + len(chunk))
+        lows[rows] = np.fmin.reduce(chunk, axis=1)
+        highs[rows] = np.fmax.reduce(chunk, axis=1)
+        bucket_xs[rows] = np.asarray(xs[start:start + step:size], dtype=np.float64)
+    return bucket_xs, lows, highs
+
+
+def lttb(xs, ys, threshold):
+    """Return (xs, ys) float arrays of at most threshold points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. NaN points are never chosen
+    unless a whole bucket is NaN, which then keeps one NaN so the chart shows
+    the gap. Series that already fit are returned as they are.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    n = len(ys)
+    if n <= threshold or threshold < 3:
+        return xs, ys
+    # threshold - 2 buckets over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    finite = ~np.isnan(ys)
+    if finite.all():
+        counts = np.diff(edges)
+        mean_x = np.add.reduceat(xs[1:-1], edges[:-1] - 1) / counts
+        mean_y = np.add.reduceat(ys[1:-1], edges[:-1] - 1) / counts
+    else:
+        counts = np.add.reduceat(finite[1:-1], edges[:-1] - 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_x = np.add.reduceat(np.where(finite, xs, 0.0)[1:-1], edges[:-1] - 1) / counts
+            mean_y = np.add.reduceat(np.where(finite, ys, 0.0)[1:-1], edges[:-1] - 1) / counts
+    # Each bucket is scored against the next bucket's centroid; an all-NaN bucket
+    # has none, so use the next bucket (or the last point) that does
+    buckets = threshold - 2
+    next_x = np.append(mean_x[1:], xs[-1])
+    next_y = np.append(mean_y[1:], ys[-1])
+    for i in range(buckets - 2, -1, -1):
+        if np.isnan(next_y[i]):
+            next_x[i], next_y[i] = next_x[i + 1], next_y[i + 1]
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(buckets):
+        start, end = edges[i], edges[i + 1]
+        cx, cy = next_x[i], next_y[i]
+        area = np.abs((xs[a] - cx) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (cy - ys[a]))
+        # No finite anchor or centroid: any finite point will do, but never a NaN one
+        area[np.isnan(area)] = 0.0
+        area[~finite[start:end]] = -1.0
+        chosen = start + int(np.argmax(area))
+        selected[i + 1] = chosen
+        if finite[chosen]:
+            a = chosen
+    return xs[selected], ys[selected]
@@ -0,0 +1,226 @@
+"""Fleet rollup: summarise many YDS exports grouped by customer and engine.
+
+Each export is parsed once (skipping the section 7 data log, which the rollup
+does not use) and reduced to a handful of flat arrays: one row per engine for
+hours by speed band, one entry per oil exchange and one per stored fault code.
+All grouping by customer and all statistics are then computed on those arrays
+with numpy, so summarising hundreds of engines costs about as much as parsing
+them.
+
+    summary = summarize(load_exports("exports/"))
+    summary['fleet']['total_hours']
+"""
+import io
+import os
+import zipfile
+
+import numpy as np
+
+import yds_parser
+from health import OK_STATUSES
+
+# Sections 4 and 6 feed the health check and the engine history
+FLEET_SECTIONS = {1, 2, 3, 4, 5, 6}
+
+
+def _iter_sources(source):
+    """Yield (name, open text stream) for every CSV under source.
+
+    source may be a CSV path, a directory (searched recursively), a zip archive,
+    or a list of any of those.
+    """
+    if isinstance(source, (list, tuple)):
+        for item in source:
+            yield from _iter_sources(item)
+    elif os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(('.csv', '.zip')):
+                    yield from _iter_sources(os.path.join(root, name))
+    elif source.lower().endswith('.zip'):
+        with zipfile.ZipFile(source) as zf:
+            for member in zf.infolist():
+                if not member.is_dir() and member.filename.lower().endswith('.csv'):
+                    with zf.open(member) as raw:
+                        yield member.filename, io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    else:
+        with open(source, 'r', encoding='utf-8', newline='') as f:
+            yield os.path.basename(source), f
+
+
+def load_exports(source):
+    """Parse every export under source. Returns (reports, errors).
+
+    reports is a list of (name, YdsReport); errors a list of (name, message) for
+    exports that could not be read, so one bad file doesn't sink the rollup.
+    """
+    reports = []
+    errors = []
+    for name, lines in _iter_sources(source):
+        try:
+            reports.append((name, yds_parser.parse(lines, FLEET_SECTIONS)))
+        except yds_parser.YdsParseError as e:
+            errors.append((name, str(e)))
+    return reports, errors
+
+
+def engine_key(name, report):
+    """(customer, engine ID) for an export; the PID, falling back to the ECM number, then the file name."""
+    return report.customer_name, report.engine_id or name
+
+
+def _latest_per_engine(reports):
+    # Counters in an export are lifetime totals, so repeat exports of one engine
+    # must not be added up; keep the export with the most operating hours.
+    latest = {}
+    for name, report in reports:
+        key = engine_key(name, report)
+        hours = report.operating_hours.total_hours or 0.0
+        if key not in latest or hours >= latest[key][0]:
+            latest[key] = (hours, name, report)
+    return [(key, name, report) for key, (_, name, report) in latest.items()]
+
+
+def _group_mean(groups, values, count):
+    """Per-group count and mean of values (NaN for empty groups)."""
+    n = np.bincount(groups, minlength=count)
+    total = np.bincount(groups, weights=values, minlength=count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return n, total / n
+
+
+def _number(value):
+    value = float(value)
+    return None if np.isnan(value) else round(value, 1)
+
+
+def summarize(reports, errors=(), health_index=None):
+    """Aggregate parsed exports into a JSON-serialisable fleet summary.
+
+    reports is a list of (name, YdsReport) as returned by load_exports. The
+    summary has fleet-wide totals, one entry per customer and one per engine.
+    With a health.HealthIndex, each engine's latest export is also health
+    checked and engines needing attention are counted.
+    """
+    engines = sorted(_latest_per_engine(reports), key=lambda entry: entry[0])
+    n_engines = len(engines)
+    health = [health_index.check(report) if health_index else None for _, _, report in engines]
+
+    band_index = {}
+    engine_rows = []
+    band_columns = []
+    band_hours = []
+    oil_engine = []
+    oil_hours = []
+    code_engine = []
+    code_values = []
+    code_items = {}
+    total_hours = np.zeros(n_engines)
+    customers = []
+    for i, ((customer, engine_id), name, report) in enumerate(engines):
+        customers.append(customer)
+        total_hours[i] = report.operating_hours.total_hours or 0.0
+        operating = report.operating_hours
+        for band in operating.bands:
+            band_columns.append(band_index.setdefault(band, len(band_index)))
+        engine_rows.extend([i] * len(operating.bands))
+        band_hours.extend(operating.hours)
+        oil_engine.extend([i] * len(report.oil_exchange.hours))
+        oil_hours.extend(sorted(report.oil_exchange.hours))
+        # Stored fault occurrences, plus any self-diagnosis item that is currently faulty
+        faults = [(entry.code, entry.item) for entry in report.diagnosis_record if entry.code]
+        faults += [(entry.code, entry.item) for entry in report.diagnosis
+                   if entry.code and entry.status and entry.status not in OK_STATUSES]
+        for code, item in faults:
+            code_engine.append(i)
+            code_values.append(code)
+            code_items.setdefault(code, item)
+
+    bands = list(band_index)
+    hours = np.zeros((n_engines, len(bands)))
+    hours[np.array(engine_rows, dtype=np.intp), np.array(band_columns, dtype=np.intp)] = band_hours
+
+    customer_names, customer_of = np.unique(np.array(customers, dtype=str), return_inverse=True)
+    n_customers = len(customer_names)
+    customer_hours = np.zeros((n_customers, len(bands)))
+    np.add.at(customer_hours, customer_of, hours)
+    customer_total = np.bincount(customer_of, weights=total_hours, minlength=n_customers)
+    customer_engines = np.bincount(customer_of, minlength=n_customers)
+
+    # Oil exchange intervals: consecutive exchanges of the same engine
+    oil_engine = np.array(oil_engine, dtype=np.intp)
+    oil_hours = np.array(oil_hours, dtype=np.float64)
+    same_engine = oil_engine[1:] == oil_engine[:-1]
+    interval_engine = oil_engine[1:][same_engine]
+    intervals = np.diff(oil_hours)[same_engine]
+    engine_exchanges = np.bincount(oil_engine, minlength=n_engines)
+    _, engine_interval = _group_mean(interval_engine, intervals, n_engines)
+    last_exchange = np.full(n_engines, np.nan)
+    np.fmax.at(last_exchange, oil_engine, oil_hours)
+    since_exchange = total_hours - last_exchange
+    customer_intervals, customer_interval = _group_mean(customer_of[interval_engine], intervals, n_customers)
+
+    # Diagnosis code frequency, overall and by number of engines affected
+    code_engine = np.array(code_engine, dtype=np.intp)
+    codes, code_of = np.unique(np.array(code_values, dtype=str), return_inverse=True)
+    code_counts = np.bincount(code_of, minlength=len(codes))
+    affected = np.unique(code_of * max(n_engines, 1) + code_engine) // max(n_engines, 1)
+    code_engines = np.bincount(affected, minlength=len(codes))
+    engine_faults = np.bincount(code_engine, minlength=n_engines)
+    customer_faults = np.bincount(customer_of[code_engine], minlength=n_customers)
+    order = np.lexsort((codes, -code_counts))
+
+    def band_table(row):
+        return [{'speed_range': band, 'hours': _number(value)} for band, value in zip(bands, row)]
+
+    return {
+        'exports': len(reports),
+        'errors': [{'file': name, 'message': message} for name, message in errors],
+        'fleet': {
+            'customers': n_customers,
+            'engines': n_engines,
+            'total_hours': _number(total_hours.sum()),
+            'operating_hours': band_table(hours.sum(axis=0)),
+            'oil_exchange': {
+                'exchanges': int(engine_exchanges.sum()),
+                'intervals': int(intervals.size),
+                'mean_interval': _number(intervals.mean()) if intervals.size else None,
+                'median_interval': _number(np.median(intervals)) if intervals.size else None,
+                'min_interval': _number(intervals.min()) if intervals.size else None,
+                'max_interval': _number(intervals.max()) if intervals.size else None,
+            },
+            'engines_needing_attention': sum(1 for result in health if result and result['flags']),
+            'diagnosis_codes': [
+                {'code': str(codes[j]), 'item': code_items[codes[j]],
+                 'occurrences': int(code_counts[j]), 'engines': int(code_engines[j])}
+                for j in order
+            ],
+        },
+        'customers': [
+            {
+                'customer_name': str(customer_names[c]),
+                'engines': int(customer_engines[c]),
+                'total_hours': _number(customer_total[c]),
+                'operating_hours': band_table(customer_hours[c]),
+                'oil_exchange_intervals': int(customer_intervals[c]),
+                'mean_oil_interval': _number(customer_interval[c]),
+                'fault_occurrences': int(customer_faults[c]),
+            }
+            for c in range(n_customers)
+        ],
+        'engines': [
+            {
+                'customer_name': customer,
+                'engine_id': engine_id,
+                'file': name,
+                'total_hours': _number(total_hours[i]),
+                'oil_exchanges': int(engine_exchanges[i]),
+                'mean_oil_interval': _number(engine_interval[i]),
+                'hours_since_oil_exchange': _number(since_exchange[i]),
+                'fault_occurrences': int(engine_faults[i]),
+                'health': health[i],
+            }
+            for i, ((customer, engine_id), name, _) in enumerate(engines)
+        ],
+    }
@@ -0,0 +1,35 @@
+"""gunicorn settings: load the app once in the master and warm every worker before it takes traffic.
+
+The master renders a throwaway report after loading the app, so python-docx,
+matplotlib, fonts and the report template are in memory before workers fork
+and are shared copy-on-write. Each worker then renders one more report in
+post_fork, before it starts accepting connections, to build its own per-process
+state. Set WARM_UP=0 to skip both.
+
+/process/batch and /process/fleet build their whole output inside the
+request, so a worker may take minutes over a large batch (up to
+BATCH_MAX_FILES files, or FLEET_MAX_FILES exports). timeout is raised from
+gunicorn's 30s default to GUNICORN_TIMEOUT (default 600s) so those requests
+are not killed part way.
+
+The same settings serve the ASGI entry point (asgi.py) for slow clients:
+
+    gunicorn --config gunicorn.conf.py --worker-class uvicorn_worker.UvicornWorker asgi:application
+"""
+import os
+
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 600))
+warm_up = os.environ.get('WARM_UP', '1') == '1'
+
+
+def when_ready(server):
+    if warm_up:
+        import app
+        server.log.info("Master warm-up took %.2fs", app.warm_up())
+
+
+def post_fork(server, worker):
+    if warm_up:
+        import app
+        server.log.info("Worker %s warm-up took %.2fs", worker.pid, app.warm_up())
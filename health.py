@@ -0,0 +1,161 @@
+"""Health check: flag out-of-range monitor and record values and active diagnosis faults.
+
+Thresholds come from a CSV of per-model ranges (Static/health_specs.csv) that
+is compiled once per process into flat numpy arrays of lower and upper bounds
+plus a dict from (section, item, unit) to a row of those arrays. A model's own
+rows are merged over the "*" defaults the first time the model is seen, so
+every later lookup is a single dict access. Checking a report then gathers
+its values and row numbers and compares them against the bounds in one numpy
+pass; section 3 codes are named through a dict built from
+Static/diagnosis_codes.csv.
+
+    index = HealthIndex.load('Static/health_specs.csv', 'Static/diagnosis_codes.csv')
+    result = index.check(report)
+    result['status'], result['flags']
+"""
+import csv
+import math
+import threading
+
+import numpy as np
+
+MODEL_NAME_FIELD = "Model name"
+DEFAULT_MODEL = '*'
+# Self-diagnosis statuses that are not faults (switch items report their position)
+OK_STATUSES = {"Normal", "ON", "OFF"}
+# section column of the spec file -> heading used in flags
+SECTION_NAMES = {'monitor': "Engine monitor", 'record': "Engine record"}
+
+
+def _rows(path):
+    """The data rows of a CSV file with '#' comment lines and a header row, as dicts."""
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(line for line in f if not line.startswith('#')))
+
+
+def _bound(text):
+    text = text.strip()
+    return float(text) if text else math.nan
+
+
+def _expected(low, high, unit):
+    unit = f" {unit}" if unit else ''
+    if math.isnan(low):
+        return f"<= {high:g}{unit}"
+    if math.isnan(high):
+        return f">= {low:g}{unit}"
+    return f"{low:g} - {high:g}{unit}"
+
+
+def flag_status_text(flag):
+    """Status column text for a flag in the reports, e.g. 'High' or 'Fault (code 24)'."""
+    return f"Fault (code {flag['code']})" if flag['code'] else flag['status'].capitalize()
+
+
+class HealthIndex:
+    """Compiled thresholds and diagnosis code names; build with HealthIndex.load."""
+
+    def __init__(self, specs, codes):
+        """specs: iterable of (model, section, item, unit, low, high) with NaN for no bound; codes: {code: name}."""
+        self._rows = {}
+        lows = []
+        highs = []
+        for model, section, item, unit, low, high in specs:
+            key = (section, item, unit)
+            self._rows.setdefault(model.strip().upper() or DEFAULT_MODEL, {})[key] = len(lows)
+            lows.append(low)
+            highs.append(high)
+        self.lows = np.array(lows, dtype=np.float64)
+        self.highs = np.array(highs, dtype=np.float64)
+        self.codes = dict(codes)
+        self._defaults = self._rows.get(DEFAULT_MODEL, {})
+        self._by_model = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, spec_path, codes_path=None):
+        specs = [(row['model'], row['section'].strip(), row['item'].strip(), row['unit'].strip(),
+                  _bound(row['min']), _bound(row['max'])) for row in _rows(spec_path)]
+        unknown = {spec[1] for spec in specs} - set(SECTION_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown section(s) in {spec_path}: {', '.join(sorted(unknown))}")
+        codes = {row['code'].strip(): row['name'].strip() for row in _rows(codes_path)} if codes_path else {}
+        return cls(specs, codes)
+
+    def _model_rows(self, model):
+        """(section, item, unit) -> spec row for a model: its own rows over the defaults, merged once."""
+        key = model.strip().upper()
+        rows = self._by_model.get(key)
+        if rows is None:
+            with self._lock:
+                rows = self._by_model.get(key)
+                if rows is None:
+                    rows = dict(self._defaults)
+                    if key and key != DEFAULT_MODEL:
+                        rows.update(self._rows.get(key, {}))
+                    self._by_model[key] = rows
+        return rows
+
+    def check(self, report):
+        """Check a parsed YdsReport. Returns a JSON-serialisable dict.
+
+        'status' is 'attention' when anything was flagged, else 'ok'; 'checked'
+        counts the values that had a threshold; 'flags' lists each out-of-range
+        value ('low'/'high') and active diagnosis fault ('fault') with string
+        fields section, item, unit, value, expected, status and code.
+        """
+        model = report.metadata.get(MODEL_NAME_FIELD).strip()
+        rows = self._model_rows(model)
+        get = rows.get
+        entries = []
+        indices = []
+        values = []
+        for section, items in (('monitor', report.engine_monitor), ('record', report.engine_record)):
+            for entry in items:
+                # Engine record counters have no unit
+                unit = getattr(entry, 'unit', '')
+                row = get((section, entry.item, unit))
+                if row is not None:
+                    value = entry.value
+                    entries.append((section, entry, unit))
+                    indices.append(row)
+                    values.append(math.nan if value is None else value)
+
+        flags = []
+        if indices:
+            indices = np.array(indices, dtype=np.intp)
+            values = np.array(values, dtype=np.float64)
+            lows = self.lows[indices]
+            highs = self.highs[indices]
+            # NaN (unreadable value or no bound) compares False, so it is never flagged
+            below = values < lows
+            above = values > highs
+            for i in np.flatnonzero(below | above):
+                section, entry, unit = entries[i]
+                flags.append({
+                    'section': SECTION_NAMES[section],
+                    'item': entry.item,
+                    'unit': unit,
+                    'value': entry.value_text.strip(),
+                    'expected': _expected(lows[i], highs[i], unit),
+                    'status': 'low' if below[i] else 'high',
+                    'code': '',
+                })
+
+        for entry in report.diagnosis:
+            if entry.status and entry.status not in OK_STATUSES:
+                flags.append({
+                    'section': "Diagnosis",
+                    'item': self.codes.get(entry.code, entry.item),
+                    'unit': '',
+                    'value': entry.status,
+                    'expected': "Normal",
+                    'status': 'fault',
+                    'code': entry.code,
+                })
+        return {
+            'model': model,
+            'status': 'attention' if flags else 'ok',
+            'checked': len(indices),
+            'flags': flags,
+        }
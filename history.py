@@ -0,0 +1,283 @@
+"""Per-engine history: every parsed export is appended to a local SQLite database.
+
+A YDS export only holds the engine's cumulative state at the moment it was
+saved (total hours, the oil exchange record, stored fault codes, lifetime
+counters). Recording each upload as a snapshot keyed by the engine serial (PID,
+falling back to the ECM number) lets trend questions such as "hours since the
+last visit" or "fault codes new since the last service" be answered from
+indexed tables instead of re-parsing old exports.
+
+Oil exchanges and stored faults are cumulative, so they are stored once per
+engine together with the snapshot they were first seen in; re-uploading the
+same export (same save time and total hours) is a no-op.
+
+    history = EngineHistory('/tmp/engine_history.sqlite3')
+    history.record(report, source='export.csv')
+    history.engine_history('6EM8591A00')['latest']['hours_since_previous']
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS engines (
+    id INTEGER PRIMARY KEY,
+    engine_id TEXT NOT NULL UNIQUE,
+    customer_name TEXT NOT NULL,
+    model_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    engine INTEGER NOT NULL REFERENCES engines (id),
+    saved_at TEXT NOT NULL,
+    total_hours_text TEXT NOT NULL,
+    total_hours REAL,
+    recorded_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    UNIQUE (engine, saved_at, total_hours_text)
+);
+CREATE TABLE IF NOT EXISTS band_hours (
+    snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    band TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (snapshot, band)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counters (
+    snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    item TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (snapshot, item)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS oil_exchanges (
+    engine INTEGER NOT NULL REFERENCES engines (id),
+    hours REAL NOT NULL,
+    first_snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    PRIMARY KEY (engine, hours)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS faults (
+    engine INTEGER NOT NULL REFERENCES engines (id),
+    code TEXT NOT NULL,
+    position TEXT NOT NULL,
+    occurred TEXT NOT NULL,
+    item TEXT NOT NULL,
+    occurred_hours REAL,
+    first_snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    PRIMARY KEY (engine, code, position, occurred)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS snapshots_by_engine ON snapshots (engine, total_hours, recorded_at);
+"""
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+class HistoryUnavailableError(Exception):
+    """Raised by the read methods when history is disabled or its database can't be read."""
+
+
+class EngineHistory:
+    def __init__(self, path, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._ready = False
+        if enabled and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connect(self):
+        # A short-lived connection per call: safe across gunicorn forks and pool workers,
+        # and cheap next to parsing an export
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(SCHEMA)
+                    self._ready = True
+        return connection
+
+    def _read_connection(self):
+        if not self.enabled:
+            raise HistoryUnavailableError("Engine history is disabled.")
+        try:
+            return self._connect()
+        except sqlite3.Error as e:
+            raise _unavailable(e) from e
+
+    def record(self, report, source=''):
+        """Append a parsed export to its engine's history.
+
+        Returns the snapshot ID, or None when the export names no engine or
+        history is disabled. Failures are logged, never raised, so a broken
+        history database can't stop a report from being generated.
+        """
+        if not self.enabled:
+            return None
+        key = report.engine_id
+        if key is None:
+            logger.debug("Export has no engine serial or ECM number; not recorded in history")
+            return None
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    return self._record(connection, key, report, source)
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            logger.warning("Could not record engine history for %s: %s", key, e)
+            return None
+
+    def _record(self, connection, key, report, source):
+        connection.execute(
+            "INSERT INTO engines (engine_id, customer_name, model_name) VALUES (?, ?, ?) "
+            "ON CONFLICT (engine_id) DO UPDATE SET customer_name = excluded.customer_name, "
+            "model_name = excluded.model_name",
+            (key, report.customer_name, report.metadata.get("Model name")),
+        )
+        engine = connection.execute("SELECT id FROM engines WHERE engine_id = ?", (key,)).fetchone()[0]
+        operating = report.operating_hours
+        saved_at = report.metadata.get("Save date & time")
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO snapshots (engine, saved_at, total_hours_text, total_hours, recorded_at, source) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (engine, saved_at, operating.total_hours_text, operating.total_hours, time.time(), source),
+        )
+        if not cursor.rowcount:
+            # Already recorded from an earlier upload of the same export
+            return connection.execute(
+                "SELECT id FROM snapshots WHERE engine = ? AND saved_at = ? AND total_hours_text = ?",
+                (engine, saved_at, operating.total_hours_text),
+            ).fetchone()[0]
+        snapshot = cursor.lastrowid
+        connection.executemany(
+            "INSERT OR REPLACE INTO band_hours (snapshot, band, hours) VALUES (?, ?, ?)",
+            [(snapshot, band, hours) for band, hours in zip(operating.bands, operating.hours)],
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO counters (snapshot, item, value) VALUES (?, ?, ?)",
+            [(snapshot, entry.item, entry.value) for entry in report.engine_record],
+        )
+        connection.executemany(
+            "INSERT OR IGNORE INTO oil_exchanges (engine, hours, first_snapshot) VALUES (?, ?, ?)",
+            [(engine, hours, snapshot) for hours in report.oil_exchange.hours],
+        )
+        connection.executemany(
+            "INSERT OR IGNORE INTO faults (engine, code, position, occurred, item, occurred_hours, first_snapshot) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(engine, entry.code, entry.position, entry.occurred, entry.item, _to_float(entry.occurred), snapshot)
+             for entry in report.diagnosis_record if entry.code],
+        )
+        return snapshot
+
+    def engines(self):
+        """Every recorded engine with its latest snapshot, most recently seen first.
+
+        Raises HistoryUnavailableError when history is disabled or unreadable.
+        """
+        connection = self._read_connection()
+        try:
+            rows = connection.execute(
+                "SELECT e.engine_id, e.customer_name, e.model_name, COUNT(s.id) AS snapshots, "
+                "MAX(s.total_hours) AS total_hours, MAX(s.recorded_at) AS last_recorded "
+                "FROM engines e JOIN snapshots s ON s.engine = e.id "
+                "GROUP BY e.id ORDER BY last_recorded DESC"
+            ).fetchall()
+        except sqlite3.Error as e:
+            raise _unavailable(e) from e
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+    def engine_history(self, key):
+        """One engine's snapshots, oldest first, each with what changed since the one before it.
+
+        'latest' repeats the newest snapshot and adds the oil exchange state and
+        the stored faults that occurred after the last oil exchange (the last
+        service). Returns None for an unknown engine; raises HistoryUnavailableError
+        when history is disabled or unreadable.
+        """
+        connection = self._read_connection()
+        try:
+            engine = connection.execute("SELECT * FROM engines WHERE engine_id = ?", (key,)).fetchone()
+            if engine is None:
+                return None
+            snapshots = [dict(row) for row in connection.execute(
+                "SELECT id, saved_at, total_hours, recorded_at, source FROM snapshots "
+                "WHERE engine = ? ORDER BY total_hours, recorded_at", (engine['id'],))]
+            new_faults = {}
+            for row in connection.execute(
+                    "SELECT first_snapshot, code, item, position, occurred FROM faults "
+                    "WHERE engine = ? ORDER BY occurred_hours, code", (engine['id'],)):
+                new_faults.setdefault(row['first_snapshot'], []).append(
+                    {field: row[field] for field in ('code', 'item', 'position', 'occurred')})
+            new_exchanges = {}
+            oil_hours = []
+            for row in connection.execute(
+                    "SELECT first_snapshot, hours FROM oil_exchanges WHERE engine = ? ORDER BY hours",
+                    (engine['id'],)):
+                new_exchanges.setdefault(row['first_snapshot'], []).append(row['hours'])
+                oil_hours.append(row['hours'])
+            counters = {}
+            for row in connection.execute(
+                    "SELECT c.snapshot, c.item, c.value FROM counters c JOIN snapshots s ON s.id = c.snapshot "
+                    "WHERE s.engine = ?", (engine['id'],)):
+                counters.setdefault(row['snapshot'], {})[row['item']] = row['value']
+            faults_since_service = [dict(row) for row in connection.execute(
+                "SELECT code, item, position, occurred FROM faults "
+                "WHERE engine = ? AND occurred_hours > ? ORDER BY occurred_hours, code",
+                (engine['id'], oil_hours[-1] if oil_hours else -1.0))]
+        except sqlite3.Error as e:
+            raise _unavailable(e) from e
+        finally:
+            connection.close()
+
+        previous = None
+        for snapshot in snapshots:
+            snapshot_id = snapshot.pop('id')
+            snapshot['counters'] = counters.get(snapshot_id, {})
+            snapshot['new_faults'] = new_faults.get(snapshot_id, [])
+            snapshot['new_oil_exchanges'] = new_exchanges.get(snapshot_id, [])
+            if previous is None:
+                snapshot['hours_since_previous'] = None
+                snapshot['counter_changes'] = {}
+            else:
+                snapshot['hours_since_previous'] = _difference(snapshot['total_hours'], previous['total_hours'])
+                changes = {item: _difference(value, previous['counters'].get(item))
+                           for item, value in snapshot['counters'].items()}
+                snapshot['counter_changes'] = {item: change for item, change in changes.items() if change}
+            previous = snapshot
+
+        latest = dict(snapshots[-1]) if snapshots else {}
+        if snapshots:
+            latest['oil_exchanges'] = len(oil_hours)
+            latest['last_oil_exchange_hours'] = oil_hours[-1] if oil_hours else None
+            latest['hours_since_oil_exchange'] = _difference(latest['total_hours'], latest['last_oil_exchange_hours'])
+            latest['faults_since_oil_exchange'] = faults_since_service
+        return {
+            'engine_id': engine['engine_id'],
+            'customer_name': engine['customer_name'],
+            'model_name': engine['model_name'],
+            'snapshots': snapshots,
+            'latest': latest,
+        }
+
+
+def _unavailable(error):
+    logger.warning("Could not read engine history: %s", error)
+    return HistoryUnavailableError("Engine history is unavailable.")
+
+
+def _difference(current, previous):
+    if current is None or previous is None:
+        return None
+    return round(current - previous, 1)
@@ -0,0 +1,179 @@
+"""In-process job queue for report generation.
+
+Jobs run on a local process pool (matplotlib's pyplot is not thread-safe and
+report building is CPU-bound). Job state is written to small JSON files on local
+disk so that any gunicorn worker can answer a status poll, no broker required.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds max_pending unfinished jobs."""
+
+
+def _write_job(jobs_dir, job):
+    path = os.path.join(jobs_dir, f"{job['id']}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def _run_job(jobs_dir, job, func, args):
+    """Executed in the pool worker: mark the job running, then call func."""
+    _write_job(jobs_dir, dict(job, status='running', started=time.time()))
+    return func(*args)
+
+
+def failure_message(error):
+    """The message recorded for a job that raised error."""
+    if isinstance(error, BrokenProcessPool):
+        return "The report worker stopped unexpectedly"
+    return str(error)
+
+
+class JobQueue:
+    def __init__(self, jobs_dir, max_workers=2, max_pending=16, on_finish=None):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.on_finish = on_finish
+        self._reset()
+        os.makedirs(jobs_dir, exist_ok=True)
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # A forked child (gunicorn worker, pool worker) owns none of its parent's jobs or pool
+        self.pending = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def workers(self):
+        """Pool processes this queue has started (the pool is created on first submit)."""
+        return self.max_workers if self._executor is not None else 0
+
+    def _get_executor(self):
+        # Created lazily so a preloaded app forks its gunicorn workers before any pool exists
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _submit(self, func, *args):
+        """Submit to the pool, replacing it first if a dead process (e.g. OOM-killed) has broken it."""
+        executor = self._get_executor()
+        try:
+            return executor.submit(func, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    logger.warning("Job pool is broken (a pool process died); starting a new one")
+                    executor.shutdown(wait=False)
+                    self._executor = None
+            return self._get_executor().submit(func, *args)
+
+    def new_job_id(self):
+        return uuid.uuid4().hex
+
+    def submit(self, func, *args, job_id=None):
+        """Queue func(*args) and return its job ID. func and args must be picklable.
+
+        The return value of func becomes the job's 'result' and must be JSON serialisable.
+        Raises QueueFullError instead of blocking when max_pending jobs are unfinished.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError(f"Job queue is full ({self.max_pending} jobs pending)")
+        job = {'id': job_id or self.new_job_id(), 'status': 'queued', 'created': time.time()}
+        try:
+            _write_job(self.jobs_dir, job)
+            future = self._submit(_run_job, self.jobs_dir, job, func, args)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.pending += 1
+        future.add_done_callback(lambda f: self._finish(job, f))
+        logger.info("Queued job %s", job['id'])
+        return job['id']
+
+    def map(self, func, items, limit=None, on_error=None):
+        """Run func over items on the queue's process pool and return the results in order.
+
+        For work a request waits on (e.g. a batch): no job files are written and
+        the pending limit doesn't apply, but the work shares the queue's fixed
+        set of processes. At most limit items are in the pool at once. With
+        on_error, an item whose call raised, or whose pool process died, gets
+        on_error(item, exception) as its result instead of map raising.
+        """
+        items = list(items)
+        slots = threading.BoundedSemaphore(max(1, limit or len(items)))
+        futures = []
+        for item in items:
+            slots.acquire()
+            try:
+                future = self._submit(func, item)
+            except Exception:
+                slots.release()
+                raise
+            future.add_done_callback(lambda f: slots.release())
+            futures.append(future)
+        results = []
+        for item, future in zip(items, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if on_error is None:
+                    raise
+                results.append(on_error(item, e))
+        return results
+
+    def _finish(self, job, future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+        job = dict(job, finished=time.time())
+        try:
+            job['result'] = future.result()
+            job['status'] = 'done'
+        except Exception as e:
+            logger.warning("Job %s failed: %s", job['id'], e)
+            job['status'] = 'failed'
+            job['message'] = failure_message(e)
+        _write_job(self.jobs_dir, job)
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def complete(self, job_id, result):
+        """Record a job that finished without going through the pool (e.g. served from a cache)."""
+        now = time.time()
+        _write_job(self.jobs_dir, {'id': job_id, 'status': 'done', 'created': now, 'finished': now, 'result': result})
+
+    def get(self, job_id):
+        """Return the job's state dict, or None if the ID is unknown."""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.jobs_dir, f"{job_id}.json"), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
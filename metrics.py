@@ -0,0 +1,278 @@
+"""Prometheus-style metrics shared by every process of the app, no external service needed.
+
+Each process (gunicorn worker or job pool worker) records counters, gauges and
+histograms in memory; recording is a dict update under a lock. A daemon thread
+writes the process's values to its own small JSON file in the metrics directory
+at most once per flush_interval, and /metrics merges all files when scraped:
+counters and histograms are summed, gauges are summed over live processes only.
+Files left behind by exited processes are folded into a single archive file so
+counters never go backwards and the directory doesn't grow.
+
+    metrics.inc('yds_http_requests_total', {'endpoint': '/process', 'status': '200'})
+    metrics.observe('yds_stage_duration_seconds', 0.42, {'stage': 'chart_bar'})
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'yds_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status code.', None),
+    'yds_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.', LATENCY_BUCKETS),
+    'yds_stage_duration_seconds': ('histogram', 'Time spent per report pipeline stage, per request or job.', LATENCY_BUCKETS),
+    'yds_upload_bytes': ('histogram', 'Size of uploaded request bodies.', SIZE_BUCKETS),
+    'yds_output_bytes': ('histogram', 'Size of generated reports by format.', SIZE_BUCKETS),
+    'yds_chart_renders_total': ('counter', 'Charts rendered by chart and backend.', None),
+    'yds_report_cache_total': ('counter', 'Report cache lookups by result.', None),
+    'yds_health_checks_total': ('counter', 'Health checks by result status.', None),
+    'yds_jobs_total': ('counter', 'Finished report jobs by status.', None),
+    'yds_jobs_rejected_total': ('counter', 'Uploads rejected because the job queue was full.', None),
+    'yds_jobs_pending': ('gauge', 'Queued or running report jobs.', None),
+    'yds_job_workers': ('gauge', 'Configured job pool workers.', None),
+    'yds_disk_usage_bytes': ('gauge', 'Bytes used under each working directory.', None),
+    'yds_processes': ('gauge', 'Live processes reporting metrics.', None),
+}
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _split_key(key):
+    name, brace, labels = key.partition('{')
+    return name, labels[:-1] if brace else ''
+
+
+def _number(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def _empty():
+    return {'counters': {}, 'gauges': {}, 'histograms': {}}
+
+
+def _merge(total, data, include_gauges=True):
+    for key, value in data.get('counters', {}).items():
+        total['counters'][key] = total['counters'].get(key, 0) + value
+    if include_gauges:
+        for key, value in data.get('gauges', {}).items():
+            total['gauges'][key] = total['gauges'].get(key, 0) + value
+    for key, hist in data.get('histograms', {}).items():
+        merged = total['histograms'].get(key)
+        if merged is None:
+            total['histograms'][key] = {'buckets': list(hist['buckets']), 'sum': hist['sum'], 'count': hist['count']}
+        else:
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], hist['buckets'])]
+            merged['sum'] += hist['sum']
+            merged['count'] += hist['count']
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class Metrics:
+    def __init__(self, directory, flush_interval=1.0, enabled=True):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._collectors = []
+        self._reset()
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            os.register_at_fork(after_in_child=self._reset)
+            atexit.register(self.flush)
+
+    def _reset(self):
+        # Runs at start-up and in every forked child: a child starts from zero under its own PID
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._data = _empty()
+        self._dirty = False
+        self._flusher = None
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing metrics")
+
+    def inc(self, name, labels=None, value=1):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            counters = self._data['counters']
+            counters[key] = counters.get(key, 0) + value
+            self._dirty = True
+            self._ensure_flusher()
+
+    def set_gauge(self, name, value, labels=None):
+        """Set this process's value of a gauge; /metrics reports the sum over live processes."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            if self._data['gauges'].get(key) != value:
+                self._data['gauges'][key] = value
+                self._dirty = True
+            self._ensure_flusher()
+
+    def add_collector(self, func):
+        """Call func() before every flush, e.g. to refresh gauges from live state."""
+        self._collectors.append(func)
+
+    def observe(self, name, value, labels=None):
+        if not self.enabled:
+            return
+        buckets = METRICS[name][2]
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._data['histograms'].get(key)
+            if hist is None:
+                hist = self._data['histograms'][key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+            self._dirty = True
+            self._ensure_flusher()
+
+    def observe_stages(self, timings):
+        """Record app_logging stage timings ({stage: milliseconds})."""
+        for stage, elapsed_ms in timings.items():
+            self.observe('yds_stage_duration_seconds', elapsed_ms / 1000, {'stage': stage})
+
+    def flush(self):
+        """Write this process's values to its file if anything changed since the last flush."""
+        if not self.enabled:
+            return
+        for func in self._collectors:
+            func()
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._data)
+            self._dirty = False
+        path = os.path.join(self.directory, f"{self._pid}.json")
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(f"{path}.tmp", path)
+
+    def _read(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def collect(self):
+        """Merge the values of every process, folding exited processes into the archive."""
+        self.flush()
+        total = _empty()
+        live = 0
+        archive_path = os.path.join(self.directory, 'archive.json')
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive = self._read(archive_path) or _empty()
+            archived = False
+            for name in os.listdir(self.directory):
+                stem, ext = os.path.splitext(name)
+                if ext != '.json' or not stem.isdigit():
+                    continue
+                path = os.path.join(self.directory, name)
+                data = self._read(path)
+                if data is None:
+                    continue
+                if _pid_alive(int(stem)):
+                    live += 1
+                    _merge(total, data)
+                else:
+                    _merge(archive, data, include_gauges=False)
+                    os.remove(path)
+                    archived = True
+            if archived:
+                with open(f"{archive_path}.tmp", 'w', encoding='utf-8') as f:
+                    json.dump(archive, f)
+                os.replace(f"{archive_path}.tmp", archive_path)
+        _merge(total, archive, include_gauges=False)
+        total['gauges'][_key('yds_processes', None)] = live
+        return total
+
+    def render(self, extra_gauges=None):
+        """The merged metrics in the Prometheus text exposition format."""
+        data = self.collect()
+        for labels_key, value in (extra_gauges or {}).items():
+            data['gauges'][labels_key] = value
+
+        by_name = {}
+        for kind in ('counters', 'gauges'):
+            for key, value in data[kind].items():
+                name, labels = _split_key(key)
+                by_name.setdefault(name, []).append(f"{key} {_number(value)}")
+        for key, hist in sorted(data['histograms'].items()):
+            name, labels = _split_key(key)
+            prefix = labels + ',' if labels else ''
+            suffix = '{' + labels + '}' if labels else ''
+            lines = by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(METRICS[name][2], hist['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{_number(bound)}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {hist["count"]}')
+            lines.append(f'{name}_sum{suffix} {_number(hist["sum"])}')
+            lines.append(f'{name}_count{suffix} {hist["count"]}')
+
+        output = []
+        for name in sorted(by_name):
+            kind, help_text, _ = METRICS.get(name, ('untyped', name, None))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(sorted(by_name[name]) if kind != 'histogram' else by_name[name])
+        return '\n'.join(output) + '\n'
+
+    def gauge_key(self, name, labels=None):
+        return _key(name, labels)
@@ -0,0 +1,291 @@
+"""Render the diagnostics report straight to PDF with matplotlib's PDF backend.
+
+Fed by the same dict as the Word report (app.extract_report_data), so the two
+formats always show the same data, but without python-docx or a Word-to-PDF
+conversion step. The layout follows the Word report: header logo, metadata in
+two columns, charts on the left beside the Engine Record and Engine Monitor
+tables on the right, then the health check, the diagnosis table and the data
+comparison graphs.
+
+Charts are drawn onto the page with charts.draw_*, so they end up as vector
+paths and selectable text in the PDF rather than embedded PNGs. Fonts are
+embedded as Type 3 (matplotlib's default): subsetting them as TrueType
+(pdf.fonttype 42) goes through fontTools and more than doubles the render time.
+
+Each column is a simple flow: a cursor moves down the page and blocks that
+don't fit continue on a new A4 page. Long tables are split between rows.
+
+    write_pdf(app.extract_report_data(report), 'report.pdf')
+"""
+import os
+
+from charts import draw_bar_chart, draw_line_chart, draw_series_chart, load_matplotlib
+from health import flag_status_text
+
+# A4 portrait and the Word report's 0.5" margins, in inches
+PAGE_SIZE = (8.27, 11.69)
+MARGIN = 0.5
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "newlogo.png")
+LOGO_WIDTH = 3.5
+# The logo is downsampled once to this resolution; the source PNG is far larger than the page needs
+LOGO_DPI = 200
+COLUMN_GAP = 0.3
+HEADING_SIZE = 10
+TEXT_SIZE = 8
+ROW_HEIGHT = 0.19
+
+_logo = None
+
+
+def _load_logo():
+    """The header logo as an RGBA array sized for LOGO_WIDTH at LOGO_DPI, or None when the file is missing."""
+    global _logo
+    if _logo is None:
+        import numpy as np
+        from PIL import Image
+
+        if not os.path.exists(LOGO_PATH):
+            _logo = False
+        else:
+            with Image.open(LOGO_PATH) as image:
+                width = int(LOGO_WIDTH * LOGO_DPI)
+                image = image.convert('RGBA').resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                _logo = np.asarray(image)
+    return _logo if _logo is not False else None
+
+
+class _Document:
+    """The pages of one PDF, each an A4 Figure with the logo header."""
+
+    def __init__(self):
+        self.pages = []
+        self.top = MARGIN
+
+    def page(self, index):
+        while len(self.pages) <= index:
+            self._add_page()
+        return self.pages[index]
+
+    def _add_page(self):
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=PAGE_SIZE, facecolor='white')
+        logo = _load_logo()
+        top = MARGIN
+        if logo is not None:
+            from matplotlib.image import BboxImage
+            from matplotlib.transforms import Bbox, TransformedBbox
+
+            # A bare image artist: an Axes per page only for the logo would cost more than the rest of the header
+            height = LOGO_WIDTH * logo.shape[0] / logo.shape[1]
+            box = Bbox.from_bounds(*_rect(((PAGE_SIZE[0] - LOGO_WIDTH) / 2, 0.1, LOGO_WIDTH, height)))
+            image = BboxImage(TransformedBbox(box, figure.transFigure), interpolation='antialiased')
+            image.set_data(logo)
+            figure.add_artist(image)
+            top = 0.1 + height + 0.3
+        self.top = top
+        self.pages.append(figure)
+
+    def save(self, output, title):
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        with PdfPages(output, metadata={'Title': title, 'Creator': 'Yamaha Diagnostics Report'}) as pdf:
+            for figure in self.pages:
+                pdf.savefig(figure)
+
+
+def _rect(box):
+    """Figure-fraction [left, bottom, width, height] of a (left, top, width, height) box in inches from the top-left."""
+    left, top, width, height = box
+    return [left / PAGE_SIZE[0], 1 - (top + height) / PAGE_SIZE[1], width / PAGE_SIZE[0], height / PAGE_SIZE[1]]
+
+
+class _Flow:
+    """A column of the document that blocks are added to top to bottom, continuing onto new pages."""
+
+    def __init__(self, document, left, width, page=0, y=None):
+        self.document = document
+        self.left = left
+        self.width = width
+        self.page = page
+        self.document.page(page)
+        self.y = document.top if y is None else y
+
+    def reserve(self, height):
+        """Move to the next page unless height inches fit below the cursor; returns (figure, top)."""
+        if self.y + height > PAGE_SIZE[1] - MARGIN and self.y > self.document.top:
+            self.page += 1
+            self.document.page(self.page)
+            self.y = self.document.top
+        top = self.y
+        self.y += height
+        return self.document.pages[self.page], top
+
+    def space(self, height):
+        self.y += height
+
+    def text(self, x, y, text, **kwargs):
+        figure = self.document.pages[self.page]
+        figure.text(x / PAGE_SIZE[0], 1 - y / PAGE_SIZE[1], text, **kwargs)
+
+    def heading(self, text, align='center', keep=0.0):
+        """A bold heading, moved to the next page with what follows unless keep more inches fit under it."""
+        self.reserve(0.3 + keep)
+        self.y -= keep
+        x = self.left + self.width / 2 if align == 'center' else self.left
+        self.text(x, self.y - 0.12, text, fontsize=HEADING_SIZE, fontweight='bold', ha=align, va='baseline')
+
+    def note(self, text):
+        self.reserve(0.25)
+        self.text(self.left + self.width / 2, self.y - 0.08, text, fontsize=TEXT_SIZE, ha='center', va='baseline')
+
+    def axes(self, height, inset):
+        """New Axes filling height inches of the column, inset (left, top, right, bottom) inches for labels."""
+        figure, top = self.reserve(height)
+        left, inset_top, right, bottom = inset
+        return figure.add_axes(_rect((self.left + left, top + inset_top, self.width - left - right,
+                                      height - inset_top - bottom)))
+
+    def table(self, header, rows, widths, align='center'):
+        """A table with a bold header row and inner rules only, split across pages between rows.
+
+        The header is repeated at the top of every continued part.
+        """
+        from matplotlib.lines import Line2D
+
+        edges = [self.left]
+        for share in widths:
+            edges.append(edges[-1] + self.width * share)
+
+        def draw_row(cells, bold):
+            figure, top = self.reserve(ROW_HEIGHT)
+            for i, cell in enumerate(cells):
+                x = (edges[i] + edges[i + 1]) / 2 if align == 'center' else edges[i] + 0.05
+                self.text(x, top + ROW_HEIGHT * 0.7, cell, fontsize=TEXT_SIZE, ha=align,
+                          fontweight='bold' if bold else 'normal')
+            return figure, top
+
+        def rule(figure, y, x0=edges[0], x1=edges[-1]):
+            figure.add_artist(Line2D([x0 / PAGE_SIZE[0], x1 / PAGE_SIZE[0]], [1 - y / PAGE_SIZE[1]] * 2,
+                                     transform=figure.transFigure, color='black', linewidth=0.5))
+
+        def vertical_rules(figure, top, bottom):
+            for x in edges[1:-1]:
+                figure.add_artist(Line2D([x / PAGE_SIZE[0]] * 2, [1 - top / PAGE_SIZE[1], 1 - bottom / PAGE_SIZE[1]],
+                                         transform=figure.transFigure, color='black', linewidth=0.5))
+
+        part_page, part_top = None, None
+        for row in rows:
+            if part_page is None or self.y + ROW_HEIGHT > PAGE_SIZE[1] - MARGIN:
+                if part_page is not None:
+                    vertical_rules(self.document.pages[part_page], part_top, self.y)
+                # Never leave a header without at least one row under it
+                self.reserve(2 * ROW_HEIGHT)
+                self.y -= 2 * ROW_HEIGHT
+                _, part_top = draw_row(header, bold=True)
+                part_page = self.page
+            rule(self.document.pages[self.page], self.y)
+            draw_row(row, bold=False)
+        if part_page is not None:
+            vertical_rules(self.document.pages[part_page], part_top, self.y)
+
+
+def write_pdf(data, output):
+    """Write an extract_report_data dict as a PDF report to output (a path or binary file object)."""
+    load_matplotlib()
+    from matplotlib import rc_context
+
+    with rc_context({'pdf.fonttype': 3}):
+        document = _build(data)
+        document.save(output, f"Yamaha Diagnostics Report - {data['customer_name']}")
+
+
+def _build(data):
+    document = _Document()
+    body_width = PAGE_SIZE[0] - 2 * MARGIN
+    flow = _Flow(document, MARGIN, body_width)
+
+    # Metadata: two columns of "Field: value", like the Word report's borderless table
+    entries = data['metadata']
+    column_width = body_width / 2
+    for i in range(0, len(entries), 2):
+        flow.reserve(0.2)
+        for column, entry in enumerate(entries[i:i + 2]):
+            middle = MARGIN + column_width * column + column_width * 0.45
+            flow.text(middle, flow.y - 0.06, f"{entry['field']}: ", fontsize=10, fontweight='bold', ha='right')
+            flow.text(middle, flow.y - 0.06, entry['value'], fontsize=10, ha='left')
+    flow.space(0.25)
+
+    # Charts on the left, Engine Record and Engine Monitor on the right
+    left_width = 3.6
+    left = _Flow(document, MARGIN, left_width, flow.page, flow.y)
+    right = _Flow(document, MARGIN + left_width + COLUMN_GAP, body_width - left_width - COLUMN_GAP, flow.page, flow.y)
+
+    left.heading("Engine Operating Hours According to Engine Speed", keep=3.8 if data['operating_hours'] else 0.25)
+    if data['operating_hours']:
+        ax = left.axes(3.8, (0.85, 0.1, 0.1, 1.25))
+        draw_bar_chart(ax, [entry['speed_range'] for entry in data['operating_hours']],
+                       [entry['hours'] for entry in data['operating_hours']])
+        ax.set_ylim(top=ax.get_ylim()[1] * 1.08)  # headroom for the value labels
+    else:
+        left.note("No significant operating hours to display.")
+    left.space(0.15)
+    left.heading("Record of Engine Oil Exchange", keep=2.5 if data['oil_exchange'] else 0.25)
+    if data['oil_exchange']:
+        ax = left.axes(2.5, (0.65, 0.1, 0.1, 0.45))
+        draw_line_chart(ax, [entry['record'] for entry in data['oil_exchange']],
+                        [entry['hours'] for entry in data['oil_exchange']])
+        ax.margins(x=0.08, y=0.15)
+    else:
+        left.note("No engine oil exchange records to display.")
+
+    right.heading("Engine Record", keep=2 * ROW_HEIGHT)
+    if data['engine_record']:
+        right.table(("Data Item", "Value"), [(entry['item'], entry['value']) for entry in data['engine_record']],
+                    (0.7, 0.3))
+    else:
+        right.note("No engine records to display.")
+    right.space(0.2)
+    right.heading("Engine Monitor", keep=2 * ROW_HEIGHT)
+    if data['engine_monitor']:
+        right.table(("Monitor Item", "Value"), [(entry['item'], entry['value']) for entry in data['engine_monitor']],
+                    (0.7, 0.3))
+    else:
+        right.note("No engine monitor data to display.")
+
+    # Full width again, below whichever column ended lower
+    flow = _Flow(document, MARGIN, body_width, *max((left.page, left.y), (right.page, right.y)))
+    flow.space(0.25)
+
+    flow.heading("Health Check", align='left', keep=2 * ROW_HEIGHT)
+    if data['health']['flags']:
+        flow.table(("Section", "Item", "Value", "Expected", "Status"),
+                   [(flag['section'], flag['item'], flag['value'], flag['expected'], flag_status_text(flag))
+                    for flag in data['health']['flags']],
+                   (0.17, 0.35, 0.12, 0.16, 0.2), align='left')
+    else:
+        flow.note("All checked values are within range and no faults are active.")
+    flow.space(0.25)
+
+    if data['diagnosis'] is not None:
+        flow.heading("Diagnosis", align='left', keep=2 * ROW_HEIGHT)
+        if data['diagnosis']:
+            flow.table(("Item", "Status", "Code"),
+                       [(entry['item'], entry['status'], entry['code']) for entry in data['diagnosis']],
+                       (0.6, 0.25, 0.15), align='left')
+        else:
+            flow.note("No diagnosis records to display.")
+        flow.space(0.25)
+
+    for log in data['data_logs']:
+        if not log['series']:
+            continue
+        flow.heading(f"Data Comparison Graph ({log['position']})" if log['position'] else "Data Comparison Graph",
+                     align='left', keep=2.2)
+        xlabel = f"Time ({log['time_unit']})" if log['time_unit'] else "Time"
+        for series in log['series']:
+            ax = flow.axes(2.2, (0.75, 0.1, 0.1, 0.45))
+            lows = [float('nan') if v is None else v for v in series['min']]
+            highs = [float('nan') if v is None else v for v in series['max']]
+            draw_series_chart(ax, series['time'], lows, highs, xlabel, f"{series['name']} ({series['unit']})")
+    return document
@@ -0,0 +1,130 @@
+"""Content-addressed cache of generated reports.
+
+Reports are keyed by a SHA-256 of the normalised CSV content plus the report
+template version, so re-uploading the same YDS export returns the previously
+generated .docx without parsing, rendering charts or building the document.
+Only the report and the customer name it was built for are stored: the
+download filename carries the date it is served on, so callers build it per
+request (app.report_filename).
+Entries live on local disk and are evicted least-recently-used first once the
+cache grows past max_bytes, and unconditionally once older than max_age.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    def __init__(self, cache_dir, version, max_bytes=256 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.version = str(version)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_stream(self, stream, chunk_size=1024 * 1024):
+        """Cache key for the CSV read from a binary stream, hashed a chunk at a time.
+
+        Line endings and trailing blank lines don't change the parsed rows, so
+        CRLF and CR are hashed as LF and trailing newlines are dropped, without
+        holding the upload in memory: a CR at the end of a chunk waits for the
+        next one, and trailing newlines are only hashed once more content
+        follows them.
+        """
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(b'\0')
+        carry_cr = False
+        newlines = b''
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            if carry_cr:
+                chunk = b'\r' + chunk
+            carry_cr = chunk.endswith(b'\r')
+            if carry_cr:
+                chunk = chunk[:-1]
+            chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            content = chunk.rstrip(b'\n')
+            if content:
+                digest.update(newlines + content)
+                newlines = chunk[len(content):]
+            else:
+                newlines += chunk
+        return digest.hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.docx", f"{base}.json"
+
+    def get(self, key):
+        """Return (report_path, customer_name) for a fresh entry, or None on a miss."""
+        report_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if time.time() - meta['created'] > self.max_age:
+                return None
+            customer_name = meta['customer_name']
+            # Touch the report so eviction treats it as recently used
+            os.utime(report_path)
+        except (OSError, ValueError, KeyError):
+            # Entries written before the customer name was stored are misses too
+            return None
+        return report_path, customer_name
+
+    def put(self, key, report_path, customer_name):
+        """Store a copy of report_path, built for customer_name, under key. Failures are logged, never raised."""
+        try:
+            with open(report_path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.error("Error caching report %s: %s", report_path, e)
+            return
+        self.put_bytes(key, customer_name, data)
+
+    def put_bytes(self, key, customer_name, data):
+        """Like put, for a report that only exists in memory."""
+        cached_report, meta_path = self._paths(key)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(cached_report + suffix, 'wb') as f:
+                f.write(data)
+            os.replace(cached_report + suffix, cached_report)
+            with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+                json.dump({'customer_name': customer_name, 'created': time.time()}, f)
+            os.replace(meta_path + suffix, meta_path)
+            self.evict()
+        except OSError as e:
+            logger.error("Error caching report for %s: %s", customer_name, e)
+
+    def evict(self):
+        """Drop expired entries, then least-recently-used ones until under max_bytes."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.docx'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name[:-len('.docx')]))
+
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, key in entries:
+                if now - mtime <= self.max_age and total <= self.max_bytes:
+                    break
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
@@ -0,0 +1,6 @@
+import os
+
+# Keep test exports out of the engine history, report cache and /metrics
+os.environ.setdefault('HISTORY_ENABLED', '0')
+os.environ.setdefault('REPORT_CACHE_ENABLED', '0')
+os.environ.setdefault('METRICS_ENABLED', '0')
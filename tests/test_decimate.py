@@ -0,0 +1,45 @@
+import numpy as np
+
+from decimate import lttb, min_max
+
+
+def _series(n=1000):
+    xs = np.arange(n, dtype=np.float64)
+    return xs, np.sin(xs / 25.0) * 100
+
+
+def test_lttb_keeps_ends_and_threshold():
+    xs, ys = _series()
+    out_x, out_y = lttb(xs, ys, 50)
+    assert len(out_x) == 50
+    assert out_x[0] == 0 and out_x[-1] == len(xs) - 1
+    assert np.all(np.diff(out_x) > 0)
+
+
+def test_lttb_skips_nan_before_an_all_nan_bucket():
+    xs, ys = _series(100)
+    edges = np.linspace(1, 99, 11).astype(np.intp)  # lttb's buckets for threshold 12
+    ys[edges[5]:edges[6]] = np.nan  # bucket 5 is all NaN
+    ys[edges[4]] = np.nan  # and bucket 4 starts with a NaN
+    out_x, out_y = lttb(xs, ys, 12)
+    # Only the all-NaN bucket contributes a NaN (the gap in the chart)
+    assert np.count_nonzero(np.isnan(out_y)) == 1
+    assert edges[5] <= out_x[np.isnan(out_y)][0] < edges[6]
+
+
+def test_lttb_with_nan_first_point():
+    xs, ys = _series(100)
+    ys[0] = np.nan
+    ys[1:5] = np.nan
+    _, out_y = lttb(xs, ys, 12)
+    assert not np.isnan(out_y[1:]).any()
+
+
+def test_min_max_ignores_nan():
+    xs, ys = _series(1000)
+    ys[:10] = np.nan
+    _, lows, highs = min_max(xs, ys, 100)
+    assert len(lows) == 100
+    assert np.isnan(lows[0]) and np.isnan(highs[0])
+    assert not np.isnan(lows[1:]).any()
+    assert np.all(lows[1:] <= highs[1:])
@@ -0,0 +1,39 @@
+import io
+import os
+import time
+
+import pytest
+
+import app
+
+SAMPLE = os.path.join(app.app.root_path, 'Static', 'sample.csv')
+
+
+def _export(customer_name):
+    with open(SAMPLE, encoding='utf-8', newline='') as f:
+        text = f.read()
+    return text.replace('"Customer name","Customer name","Bribie 3"',
+                        f'"Customer name","Customer name","{customer_name}"').encode('utf-8')
+
+
+def _wait(client, status_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"{status_url} did not finish")
+
+
+@pytest.mark.parametrize('customer_name', ["O'Brien Marine", "Café Boats"])
+def test_download_report_for_customer_name_with_punctuation(customer_name):
+    client = app.app.test_client()
+    response = client.post('/process', data={'file': (io.BytesIO(_export(customer_name)), 'export.csv')})
+    assert response.status_code == 202
+    job = _wait(client, response.get_json()['status_url'])
+    assert job['status'] == 'done'
+
+    download = client.get(job['download_url'])
+    assert download.status_code == 200
+    assert download.data[:2] == b'PK'
@@ -0,0 +1,44 @@
+import os
+
+import yds_parser
+from health import HealthIndex
+
+STATIC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Static')
+SAMPLE = os.path.join(STATIC, 'sample.csv')
+
+
+def _index():
+    return HealthIndex.load(os.path.join(STATIC, 'health_specs.csv'), os.path.join(STATIC, 'diagnosis_codes.csv'))
+
+
+def _report(text):
+    return yds_parser.parse(text.splitlines(keepends=True))
+
+
+def _sample():
+    with open(SAMPLE, encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def test_healthy_sample_is_ok():
+    # The sample's lifetime record counters (overheat, over-rev) are non-zero but must not flag it
+    result = _index().check(yds_parser.parse_file(SAMPLE))
+    assert result['status'] == 'ok'
+    assert result['flags'] == []
+    assert result['checked'] > 0
+
+
+def test_out_of_range_monitor_value_is_flagged():
+    text = _sample().replace('"Battery voltage","Battery voltage","V","V","13.90"',
+                             '"Battery voltage","Battery voltage","V","V","11.20"')
+    result = _index().check(_report(text))
+    assert result['status'] == 'attention'
+    assert [(flag['item'], flag['status']) for flag in result['flags']] == [("Battery voltage", 'low')]
+
+
+def test_active_diagnosis_fault_is_flagged():
+    text = _sample().replace('"Thermo sensor","Thermo sensor","Normal","Normal"',
+                             '"Thermo sensor","Thermo sensor","Abnormal","Abnormal"')
+    result = _index().check(_report(text))
+    assert result['status'] == 'attention'
+    assert [(flag['status'], flag['code']) for flag in result['flags']] == [('fault', '15')]
@@ -0,0 +1,55 @@
+import os
+import signal
+import time
+
+from jobs import JobQueue
+
+
+def _die():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _add(a, b):
+    return a + b
+
+
+def _die_or_double(n):
+    if n == 1:
+        _die()
+    return n * 2
+
+
+def _wait(queue, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job and job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_submit_after_pool_process_dies(tmp_path):
+    queue = JobQueue(str(tmp_path), max_workers=1)
+    try:
+        job = _wait(queue, queue.submit(_die))
+        assert job['status'] == 'failed'
+        assert job['message'] == "The report worker stopped unexpectedly"
+
+        job = _wait(queue, queue.submit(_add, 2, 3))
+        assert job['status'] == 'done'
+        assert job['result'] == 5
+        assert queue.pending == 0
+    finally:
+        queue.shutdown()
+
+
+def test_map_after_pool_process_dies(tmp_path):
+    queue = JobQueue(str(tmp_path), max_workers=1)
+    try:
+        results = queue.map(_die_or_double, [1, 2], on_error=lambda item, e: 'failed')
+        assert results[0] == 'failed'
+        assert results[1] in (4, 'failed')  # 2 may have been queued behind the dead process
+        assert queue.map(_die_or_double, [3, 4]) == [6, 8]
+    finally:
+        queue.shutdown()
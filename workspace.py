@@ -0,0 +1,121 @@
+"""Per-request workspaces and the background sweeper that expires them.
+
+Every request gets its own upload and output directory named by a random
+workspace ID, so concurrent requests (across gunicorn workers and threads)
+never touch each other's files. Old workspaces are removed by a background
+sweeper bounded by age and total size instead of purging inline on each request.
+"""
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def is_workspace_id(value):
+    return bool(WORKSPACE_ID_PATTERN.match(value))
+
+
+class Workspace:
+    def __init__(self, upload_root, download_root, workspace_id=None):
+        self.id = workspace_id or uuid.uuid4().hex
+        self.upload_dir = os.path.join(upload_root, self.id)
+        self.output_dir = os.path.join(download_root, self.id)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def upload_path(self, filename):
+        return os.path.join(self.upload_dir, filename)
+
+    def discard_uploads(self):
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+
+def _entry_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove_entry(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class WorkspaceSweeper:
+    """Removes top-level entries of the given roots once they exceed max_age
+    seconds, then the oldest remaining entries while the roots hold more than
+    max_bytes in total."""
+
+    def __init__(self, roots, max_age=3600, max_bytes=1024 * 1024 * 1024, interval=60):
+        self.roots = roots
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        """Start the sweeper thread once per process (gunicorn forks after import)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='workspace-sweeper', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Error sweeping workspaces")
+            time.sleep(self.interval)
+
+    def sweep(self):
+        """Run one sweep and return the number of entries removed."""
+        now = time.time()
+        entries = []
+        for root in self.roots:
+            try:
+                names = os.listdir(root)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    entries.append((os.path.getmtime(path), _entry_size(path), path))
+                except OSError:
+                    continue
+
+        removed = 0
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            _remove_entry(path)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info("Workspace sweeper removed %d expired entries", removed)
+        return removed
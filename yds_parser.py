@@ -0,0 +1,406 @@
+"""Single-pass parser for Yamaha Diagnostic System (YDS) CSV exports.
+
+parse() reads the export row by row and dispatches each row to the handler of
+the section it belongs to, building a compact typed model as it goes. Nothing
+but the model is kept in memory. The data comparison graph (section 7) is
+stored in typed arrays, and a log longer than DATA_LOG_CHUNK_ROWS rows is
+written out to an anonymous temporary file chunk by chunk and handed back as
+read-only numpy memmaps, so parse memory stays flat however long the logged sea
+trial was.
+
+The module has no Flask or report dependencies and can be used on its own:
+
+    report = parse_file("export.csv")
+    report.metadata.get("Customer name")
+    report.operating_hours.total_hours
+"""
+import csv
+import math
+import tempfile
+from array import array
+
+PID_FIELD = "Engine serial number (PID number)"
+# Rows of a data log buffered in memory before they are spilled to disk
+DATA_LOG_CHUNK_ROWS = 16384
+# The engine monitor is read up to this row; the switch states after it are left out of the report.
+# Exports spell it "shut off" or "shut-off".
+MONITOR_LAST_ITEM = "engine shut off switch"
+
+SECTION_TITLES = {
+    1: "Engine operating hours according to engine speed",
+    2: "Record of engine oil exchange",
+    3: "Diagnosis",
+    4: "Engine monitor",
+    5: "Diagnosis record",
+    6: "Engine record",
+    7: "Data comparison graph",
+}
+
+
+class YdsParseError(ValueError):
+    """Raised when the input cannot be read as a YDS export."""
+
+
+def _name(cell):
+    # Normalises odd whitespace such as the ideographic space in "ECM　number"
+    return ' '.join(cell.strip('"').split())
+
+
+def _cell(row, index):
+    return row[index].strip('"') if len(row) > index else ''
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _section_number(first_cell):
+    head, dot, _ = first_cell.partition('.')
+    if dot and head.isdigit() and int(head) in SECTION_TITLES:
+        return int(head)
+    return None
+
+
+class Metadata:
+    """Header fields in file order, plus the free-text comment."""
+    __slots__ = ('fields', 'comment')
+
+    def __init__(self):
+        self.fields = []
+        self.comment = ''
+
+    def get(self, name, default=''):
+        for field, value in self.fields:
+            if field == name:
+                return value
+        return default
+
+
+class OperatingHours:
+    """Section 1: hours spent in each engine speed band."""
+    __slots__ = ('bands', 'hours', 'total_hours_text')
+
+    def __init__(self):
+        self.bands = []
+        self.hours = array('d')
+        self.total_hours_text = ''
+
+    @property
+    def total_hours(self):
+        return _to_float(self.total_hours_text)
+
+
+class OilExchange:
+    """Section 2: engine hours at each recorded oil exchange."""
+    __slots__ = ('records', 'hours')
+
+    def __init__(self):
+        self.records = array('i')
+        self.hours = array('d')
+
+
+class DiagnosisItem:
+    """Section 3: current status of one self-diagnosis item."""
+    __slots__ = ('item', 'status', 'code')
+
+    def __init__(self, item, status, code):
+        self.item = item
+        self.status = status
+        self.code = code
+
+
+class MonitorItem:
+    """Section 4: one live engine monitor reading."""
+    __slots__ = ('item', 'unit', 'value_text')
+
+    def __init__(self, item, unit, value_text):
+        self.item = item
+        self.unit = unit
+        self.value_text = value_text
+
+    @property
+    def value(self):
+        return _to_float(self.value_text)
+
+
+class DiagnosisRecordEntry:
+    """Section 5: one stored fault occurrence."""
+    __slots__ = ('item', 'position', 'occurred', 'code')
+
+    def __init__(self, item, position, occurred, code):
+        self.item = item
+        self.position = position
+        self.occurred = occurred
+        self.code = code
+
+
+class EngineRecordItem:
+    """Section 6: one lifetime counter and the engine hours it was last updated at."""
+    __slots__ = ('item', 'value_text', 'hours_text')
+
+    def __init__(self, item, value_text, hours_text):
+        self.item = item
+        self.value_text = value_text
+        self.hours_text = hours_text
+
+    @property
+    def value(self):
+        return _to_float(self.value_text)
+
+
+class DataLog:
+    """Section 7: the time series logged for one engine position.
+
+    channels holds (name, unit) pairs; columns holds one float array per
+    channel (NaN where the logger recorded no value), aligned with times.
+    Short logs are held as array('d'); logs that outgrew DATA_LOG_CHUNK_ROWS
+    are numpy memmap views of a temporary file, read from disk on demand.
+    """
+    __slots__ = ('position', 'channels', 'times', 'time_unit', 'columns', '_rows', '_spill', '_spilled')
+
+    def __init__(self, position=''):
+        self.position = position
+        self.channels = []
+        self.times = array('d')
+        self.time_unit = ''
+        self.columns = []
+        self._rows = array('d')  # row-major (time, value, value, ...) rows not yet in times/columns
+        self._spill = None
+        self._spilled = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, time, values):
+        self._rows.append(time)
+        self._rows.extend(values)
+        if len(self._rows) >= DATA_LOG_CHUNK_ROWS * (len(values) + 1):
+            self._flush()
+
+    def _flush(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix='yds-datalog-')
+        self._rows.tofile(self._spill)
+        self._spilled += len(self._rows) // (len(self.channels) + 1)
+        self._rows = array('d')
+
+    def finish(self):
+        """Move the buffered rows into times and columns once the log's last row is parsed."""
+        width = len(self.channels) + 1
+        if self._spill is None:
+            rows = self._rows
+            self.times = rows[0::width]
+            self.columns = [rows[i::width] for i in range(1, width)]
+        else:
+            import numpy as np
+
+            self._flush()
+            self._spill.flush()
+            # The map keeps its own handle; the file is already unlinked and goes away with it
+            table = np.memmap(self._spill, dtype=np.float64, mode='r', shape=(self._spilled, width))
+            self._spill.close()
+            self._spill = None
+            self.times = table[:, 0]
+            self.columns = [table[:, i] for i in range(1, width)]
+        self._rows = array('d')
+
+
+class YdsReport:
+    __slots__ = ('metadata', 'operating_hours', 'oil_exchange', 'diagnosis', 'engine_monitor',
+                 'diagnosis_record', 'engine_record', 'data_logs', 'sections_found')
+
+    def __init__(self):
+        self.metadata = Metadata()
+        self.operating_hours = OperatingHours()
+        self.oil_exchange = OilExchange()
+        self.diagnosis = []
+        self.engine_monitor = []
+        self.diagnosis_record = []
+        self.engine_record = []
+        self.data_logs = []
+        self.sections_found = set()
+
+    @property
+    def customer_name(self):
+        return self.metadata.get("Customer name") or "Unknown"
+
+    @property
+    def engine_id(self):
+        """The engine's serial (PID number), falling back to the ECM number; None if the export has neither."""
+        return self.metadata.get(PID_FIELD).strip() or self.metadata.get("ECM number").strip() or None
+
+
+class _Parser:
+    def __init__(self, sections=None):
+        self.report = YdsReport()
+        self.section = 0
+        self.expect_comment = False
+        self.code_column = 8
+        self.monitor_done = False
+        self.channel_names = None
+        self.data_log = None
+        self.handlers = {
+            0: self._metadata_row,
+            1: self._operating_hours_row,
+            2: self._oil_exchange_row,
+            3: self._diagnosis_row,
+            4: self._monitor_row,
+            5: self._diagnosis_record_row,
+            6: self._engine_record_row,
+            7: self._data_log_row,
+        }
+        if sections is not None:
+            for number in SECTION_TITLES:
+                if number not in sections:
+                    self.handlers[number] = self._skip_row
+
+    def feed(self, row):
+        if not any(row):
+            return
+        number = _section_number(row[0])
+        if number is not None:
+            self.section = number
+            self.report.sections_found.add(number)
+            return
+        self.handlers[self.section](row)
+
+    def _skip_row(self, row):
+        pass
+
+    def _metadata_row(self, row):
+        name = _name(row[0])
+        if self.expect_comment:
+            self.expect_comment = False
+            # The comment is a lone cell on the line after "Comment"; an empty comment has no such line
+            if sum(1 for cell in row if cell.strip()) == 1:
+                self.report.metadata.comment = row[0].strip()
+                return
+        if name == "Comment":
+            self.expect_comment = True
+            return
+        value = _cell(row, 2)
+        if not value.strip() and _name(_cell(row, 1)) != name:
+            value = _cell(row, 1)
+        self.report.metadata.fields.append((name, value if value.strip() else ''))
+
+    def _operating_hours_row(self, row):
+        label = row[0].strip('"')
+        hours = self.report.operating_hours
+        if label == "Total operating hours":
+            hours.total_hours_text = _cell(row, 2).strip()
+        elif "r/min" in label and len(row) >= 2:
+            value = _to_float(_cell(row, 2) or "0")
+            if value is not None:
+                hours.bands.append(label)
+                hours.hours.append(value)
+
+    def _oil_exchange_row(self, row):
+        record, hours = _cell(row, 0), _to_float(_cell(row, 2))
+        if record.isdigit() and hours is not None:
+            self.report.oil_exchange.records.append(int(record))
+            self.report.oil_exchange.hours.append(hours)
+
+    def _diagnosis_row(self, row):
+        if _name(row[0]) == "Item":
+            cells = [_name(cell) for cell in row]
+            if "Code" in cells:
+                self.code_column = cells.index("Code")
+            return
+        code = _cell(row, self.code_column).strip()
+        self.report.diagnosis.append(DiagnosisItem(_name(row[0]), _cell(row, 2).strip(), code))
+
+    def _monitor_row(self, row):
+        item = _name(row[0])
+        if self.monitor_done or item.startswith("Monitor item"):
+            return
+        if item.lower().replace('-', ' ') == MONITOR_LAST_ITEM:
+            self.monitor_done = True
+            return
+        self.report.engine_monitor.append(MonitorItem(item, _cell(row, 2), _cell(row, 4)))
+
+    def _diagnosis_record_row(self, row):
+        if _name(row[0]) == "Item":
+            return
+        self.report.diagnosis_record.append(
+            DiagnosisRecordEntry(_name(row[0]), _cell(row, 2), _cell(row, 4), _cell(row, 6).strip()))
+
+    def _engine_record_row(self, row):
+        if _name(row[0]) == "Data item":
+            return
+        self.report.engine_record.append(EngineRecordItem(_name(row[0]), _cell(row, 2), _cell(row, 3).strip()))
+
+    def _data_log_row(self, row):
+        first = _name(row[0])
+        if first == "Engine position":
+            self.finish()
+            self.data_log = DataLog(_cell(row, 2))
+            self.channel_names = None
+            return
+        if self.data_log is None:
+            return
+        log = self.data_log
+        if first == "Time":
+            if self.channel_names:
+                log.channels = [(name, _cell(row, 4 + i)) for i, name in enumerate(self.channel_names)]
+                self.report.data_logs.append(log)
+            return
+        if not first:
+            # Channel name/unit header rows; the names row is the one without [units]
+            names = [_name(cell) for cell in row[4:]]
+            if self.channel_names is None and names and not names[0].startswith('['):
+                self.channel_names = names
+            return
+        time = _to_float(first)
+        if time is None or not log.channels:
+            return
+        if not log.time_unit:
+            log.time_unit = _cell(row, 2)
+        width = len(log.channels)
+        try:
+            # Fast path: every channel logged a plain number (the usual case for long logs)
+            values = list(map(float, row[4:4 + width]))
+        except ValueError:
+            values = None
+        if values is None or len(values) < width:
+            values = []
+            for i in range(width):
+                value = _to_float(_cell(row, 4 + i)) if len(row) > 4 + i else None
+                values.append(math.nan if value is None else value)
+        log.append(time, values)
+
+    def finish(self):
+        if self.data_log is not None:
+            self.data_log.finish()
+            self.data_log = None
+
+
+def parse(lines, sections=None):
+    """Parse an iterable of CSV text lines (an open file, a wrapped stream) into a YdsReport.
+
+    sections optionally limits which numbered sections are collected, e.g. {1, 2}
+    to skip the data log; the header metadata is always read.
+    """
+    parser = _Parser(sections)
+    rows = 0
+    try:
+        for row in csv.reader(lines):
+            if rows == 0 and row and row[0].startswith('\ufeff'):
+                row[0] = row[0][1:]
+            rows += 1
+            parser.feed(row)
+    except UnicodeDecodeError as e:
+        raise YdsParseError(f"Failed to read CSV file due to encoding issue: {str(e)}")
+    except csv.Error as e:
+        raise YdsParseError(f"Error parsing CSV file: {str(e)}")
+    if not rows:
+        raise YdsParseError("CSV file is empty")
+    parser.finish()
+    return parser.report
+
+
+def parse_file(path, sections=None):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return parse(f, sections)